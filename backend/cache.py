@@ -0,0 +1,117 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    etag: str
+    expires_at: float
+
+
+def compute_etag(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, default=str).encode()
+    return f'"{hashlib.sha1(payload).hexdigest()}"'
+
+
+def key_kind(key: str) -> str:
+    # "stats:<user>" -> "stats"
+    return key.split(":", 1)[0]
+
+
+class ReadThroughCache:
+    """In-process read-through cache with a TTL and explicit invalidation.
+
+    Concurrent misses on the same key share one load. A load that races with
+    an invalidation is returned to its caller but not stored, so a write is
+    never shadowed by the read that was in flight when it happened.
+
+    Keys are per user, so only the entries themselves are kept per key, and
+    expired ones are swept once per TTL. Locks and generations exist only
+    while a load is in flight; hits and misses are counted by key kind.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, CacheEntry] = {}
+        # key -> (lock, callers holding or waiting for it)
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+        # key -> invalidations since its in-flight load started
+        self._generations: Dict[str, int] = {}
+        self._swept_at = time.monotonic()
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+
+    def _fresh(self, key: str):
+        entry = self._entries.get(key)
+        if entry and entry.expires_at > time.monotonic():
+            return entry
+        return None
+
+    @contextlib.asynccontextmanager
+    async def _lock(self, key: str):
+        lock, users = self._locks.get(key) or (asyncio.Lock(), 0)
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    def _sweep(self, now: float):
+        if now - self._swept_at >= self.ttl:
+            self._swept_at = now
+            for key in [key for key, entry in self._entries.items() if entry.expires_at <= now]:
+                del self._entries[key]
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[Any]]) -> CacheEntry:
+        entry = self._fresh(key)
+        if entry:
+            self.hits[key_kind(key)] += 1
+            return entry
+        async with self._lock(key):
+            entry = self._fresh(key)
+            if entry:
+                self.hits[key_kind(key)] += 1
+                return entry
+            self.misses[key_kind(key)] += 1
+            self._generations[key] = 0
+            try:
+                value = await loader()
+            finally:
+                invalidated = self._generations.pop(key)
+            now = time.monotonic()
+            entry = CacheEntry(value, compute_etag(value), now + self.ttl)
+            if not invalidated:
+                self._sweep(now)
+                self._entries[key] = entry
+            return entry
+
+    def invalidate(self, *keys: str):
+        for key in keys:
+            if key in self._generations:
+                self._generations[key] += 1
+            self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str):
+        self.invalidate(*(key for key in self._generations.keys() | self._entries.keys() if key.startswith(prefix)))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Hits, misses and cached entries by key kind."""
+        cached = defaultdict(int)
+        for key in self._entries:
+            cached[key_kind(key)] += 1
+        return {
+            kind: {"hits": self.hits[kind], "misses": self.misses[kind], "cached": cached[kind]}
+            for kind in sorted(self.hits.keys() | self.misses.keys() | cached.keys())
+        }
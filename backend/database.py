@@ -0,0 +1,101 @@
+import os
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+
+# Default analytics pool; small so analytics queue among themselves instead
+# of competing with writes for server resources
+ANALYTICS_MAX_POOL_SIZE = 10
+
+
+def _int_env(name: str) -> Optional[int]:
+    value = os.environ.get(name, "").strip()
+    return int(value) if value else None
+
+
+def client_options(prefix: str) -> dict:
+    """Motor client options from `<prefix>*` environment variables; unset ones keep the driver default."""
+    options = {
+        "maxPoolSize": _int_env(f"{prefix}MAX_POOL_SIZE"),
+        "minPoolSize": _int_env(f"{prefix}MIN_POOL_SIZE"),
+        "serverSelectionTimeoutMS": _int_env(f"{prefix}SERVER_SELECTION_TIMEOUT_MS"),
+        "connectTimeoutMS": _int_env(f"{prefix}CONNECT_TIMEOUT_MS"),
+        "socketTimeoutMS": _int_env(f"{prefix}SOCKET_TIMEOUT_MS"),
+        # Client-side operation timeout; the driver sends each command the
+        # remaining budget as maxTimeMS so the server stops work we gave up on
+        "timeoutMS": _int_env(f"{prefix}TIMEOUT_MS"),
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+class Database:
+    """Owns the Motor clients: created by connect() on startup, closed on shutdown.
+
+    Writes and ordinary reads go through the primary client. Heavy analytics
+    reads use a second client with its own, smaller connection pool and
+    secondaryPreferred reads, so a burst of analytics queries cannot hold every
+    pooled connection while activity writes wait for one, and is served by a
+    secondary when the deployment has one.
+
+    Pool and timeout settings come from MONGO_* variables for the primary
+    client and MONGO_ANALYTICS_* for the analytics one.
+    """
+
+    def __init__(self, url: str, name: str, event_listeners=()):
+        self.url = url
+        self.name = name
+        self.event_listeners = list(event_listeners)
+        self.client = None
+        self.analytics_client = None
+
+    def connect(self, client=None):
+        """Create the clients; a given `client` (e.g. an in-memory stand-in) serves both roles."""
+        if self.client is not None:
+            return self
+        if client is not None:
+            self.client = self.analytics_client = client
+            return self
+        self.client = AsyncIOMotorClient(self.url, event_listeners=self.event_listeners, **client_options("MONGO_"))
+        self.analytics_client = AsyncIOMotorClient(
+            self.url,
+            event_listeners=self.event_listeners,
+            readPreference=os.environ.get("MONGO_ANALYTICS_READ_PREFERENCE", "secondaryPreferred"),
+            **{"maxPoolSize": ANALYTICS_MAX_POOL_SIZE, **client_options("MONGO_ANALYTICS_")},
+        )
+        return self
+
+    def close(self):
+        if self.analytics_client is not None and self.analytics_client is not self.client:
+            self.analytics_client.close()
+        if self.client is not None:
+            self.client.close()
+        self.client = self.analytics_client = None
+
+    def primary(self):
+        if self.client is None:
+            raise RuntimeError("Database is not connected")
+        return self.client[self.name]
+
+    def analytics(self):
+        if self.analytics_client is None:
+            raise RuntimeError("Database is not connected")
+        return self.analytics_client[self.name]
+
+
+class DatabaseHandle:
+    """Module-level stand-in for an AsyncIOMotorDatabase.
+
+    Resolves to the connected client's database on every use, so code can
+    hold `db` from import time while the client itself only exists between
+    startup and shutdown.
+    """
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
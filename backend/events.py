@@ -0,0 +1,34 @@
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Server error codes for "this deployment has no change streams": a
+# standalone mongod (40573), or a server that does not know $changeStream
+# at all (40324)
+CHANGE_STREAMS_UNSUPPORTED = {40573, 40324}
+
+# Sent on an idle stream so proxies and load balancers keep it open
+KEEP_ALIVE = b": keep-alive\n\n"
+
+
+def format_event(event: str, data, event_id: Optional[str] = None) -> bytes:
+    """One Server-Sent Events message; `event_id` is what the client sends back as Last-Event-ID."""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def changed_fields(previous: dict, current: dict, fields: Iterable[str]) -> dict:
+    """The `fields` whose value differs between two versions of a document."""
+    return {name: current.get(name) for name in fields if previous.get(name) != current.get(name)}
+
+
+def diff_documents(previous: Dict[str, dict], current: Dict[str, dict]) -> Tuple[List[dict], List[str], List[Tuple[dict, dict]]]:
+    """Compare two id -> document snapshots: (created documents, deleted ids, (old, new) pairs that changed)."""
+    created = [document for key, document in current.items() if key not in previous]
+    deleted = [key for key in previous if key not in current]
+    changed = [
+        (previous[key], document) for key, document in current.items()
+        if key in previous and previous[key] != document
+    ]
+    return created, deleted, changed
@@ -0,0 +1,86 @@
+import asyncio
+
+import typer
+
+import server
+
+cli = typer.Typer(help="LevelUp Life maintenance commands")
+
+def run(coro):
+    server.database.connect()
+    try:
+        return asyncio.run(coro)
+    finally:
+        server.database.close()
+
+@cli.command("ensure-indexes")
+def ensure_indexes():
+    """Create the managed indexes (idempotent)."""
+    run(server.ensure_indexes())
+    typer.echo("Indexes ensured")
+
+@cli.command("check-indexes")
+def check_indexes():
+    """Explain every handler query shape and exit non-zero on a COLLSCAN."""
+    async def _check():
+        await server.ensure_indexes()
+        await server.check_query_plans()
+    try:
+        run(_check())
+    except RuntimeError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+    typer.echo(f"All {len(server.QUERY_SHAPES)} query shapes use an index")
+
+@cli.command("migrate-users")
+def migrate_users():
+    """Move data from before multi-user support to the default user."""
+    async def _migrate():
+        await server.ensure_indexes()
+        await server.migrate_to_default_user()
+        await server.ensure_user(server.DEFAULT_USER_ID)
+    run(_migrate())
+    typer.echo(f"Existing data now belongs to user {server.DEFAULT_USER_ID!r}")
+
+@cli.command("migrate-activities")
+def migrate_activities(
+    batch_size: int = typer.Option(server.ACTIVITY_MIGRATION_BATCH_SIZE, "--batch-size", help="activities rewritten per bulk_write"),
+    restart: bool = typer.Option(False, "--restart", help="ignore the checkpoint and rescan every activity"),
+):
+    """Rewrite schema 1 activities as schema 2, resuming from the last checkpoint."""
+    async def _migrate():
+        await server.ensure_indexes()
+        await server.migrate_to_default_user()
+        await server.init_activity_minutes()
+        return await server.migrate_activities(batch_size, restart=restart)
+    count = run(_migrate())
+    typer.echo(f"Migrated {count} activities to schema {server.ACTIVITY_SCHEMA}")
+
+@cli.command("rebuild-rollups")
+def rebuild_rollups():
+    """Recompute daily_rollups from raw activities."""
+    run(server.rebuild_daily_rollups())
+    typer.echo("Daily rollups rebuilt")
+
+@cli.command("verify-rollups")
+def verify_rollups():
+    """Diff daily_rollups against raw activities and exit non-zero on drift."""
+    mismatches = run(server.verify_daily_rollups())
+    for mismatch in mismatches:
+        typer.echo(
+            f"{mismatch['user_id']} {mismatch['date']} {mismatch['category_id']}: "
+            f"expected {mismatch['expected']}, found {mismatch['actual']}",
+            err=True,
+        )
+    if mismatches:
+        raise typer.Exit(code=1)
+    typer.echo("Daily rollups match raw activities")
+
+@cli.command("recompute-goals")
+def recompute_goals(user_id: str = typer.Option(None, "--user", help="only this user's goals")):
+    """Recompute goal progress for the current period windows from daily_rollups."""
+    count = run(server.recompute_goal_progress(user_id))
+    typer.echo(f"Recomputed progress for {count} goals")
+
+if __name__ == "__main__":
+    cli()
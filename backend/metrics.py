@@ -0,0 +1,151 @@
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo import monitoring
+
+# Seconds; spans a cached read (~0.5ms) up to a slow export
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Latency histogram per label set, rendered in Prometheus text format.
+
+    Observations may come from Motor's worker threads (command listeners) as
+    well as the event loop, so updates take a lock; each is a bisect and a
+    few additions.
+    """
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., count above the last bucket, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, values: Tuple[str, ...], seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {values: list(series) for values, series in self._series.items()}
+        for values, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+def render_counter(name: str, help: str, labels: Tuple[str, ...], samples: Dict[Tuple[str, ...], float]) -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+    lines.extend(f"{name}{_labels(labels, values)} {_number(value)}" for values, value in sorted(samples.items()))
+    return lines
+
+
+class MetricsRegistry:
+    """The histograms the app records into; `enabled` switches recording off at runtime."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.http_requests = Histogram(
+            "levelup_http_request_duration_seconds",
+            "HTTP request latency by route template and status.",
+            ("method", "route", "status"),
+        )
+        self.mongodb_commands = Histogram(
+            "levelup_mongodb_command_duration_seconds",
+            "MongoDB command latency by command and collection.",
+            ("command", "collection", "outcome"),
+        )
+
+    def render(self) -> List[str]:
+        return self.http_requests.render() + self.mongodb_commands.render()
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request until its last body chunk is sent.
+
+    Requests are labelled with the matched route template rather than the raw
+    path, so per-id URLs do not create a series each.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.registry.enabled:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.registry.http_requests.observe((scope["method"], route, str(status)), time.perf_counter() - started)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """pymongo command listener recording each command's server round trip.
+
+    The collection is only on the started event, so it is remembered until the
+    matching succeeded/failed event arrives.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._pending: Dict[Tuple, Tuple[str, str]] = {}
+
+    def started(self, event):
+        if not self.registry.enabled:
+            return
+        name = event.command_name
+        target = event.command.get("collection") if name == "getMore" else event.command.get(name)
+        self._pending[(event.connection_id, event.request_id)] = (name, target if isinstance(target, str) else "")
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
+
+    def _record(self, event, outcome: str):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        self.registry.mongodb_commands.observe(pending + (outcome,), event.duration_micros / 1_000_000)
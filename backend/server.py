@@ -1,29 +1,66 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from cache import ReadThroughCache
+from database import Database, DatabaseHandle
+from worker import CoalescingQueue
+from trends import compute_trends, daily_matrix, lookback_days
+from events import CHANGE_STREAMS_UNSUPPORTED, KEEP_ALIVE, changed_fields, diff_documents, format_event
+from metrics import CommandMetrics, MetricsMiddleware, MetricsRegistry, render_counter
+from bson import ObjectId
+from pymongo import IndexModel, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ExecutionTimeout, NetworkTimeout, OperationFailure, PyMongoError, ServerSelectionTimeoutError
 import os
+import io
+import numpy as np
+import orjson
+import re
+import csv
+import asyncio
+import json
+import math
+import uuid
+import base64
+import socket
+import functools
+import bisect
+import time
 import logging
+import importlib.util
+import jwt
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
 from typing import List, Optional
 from datetime import datetime, timezone, timedelta
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Identifies this process in claims on shared work (outbox entries, the
+# initial rollup build)
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
 
-app = FastAPI()
+# Request and MongoDB command timings, scraped from /metrics
+metrics = MetricsRegistry(enabled=os.environ.get('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes'))
+
+# Clients are created on startup and closed on shutdown; `db` and
+# `analytics_db` resolve to them on use. See database.py for the MONGO_*
+# pool and timeout settings.
+database = Database(os.environ['MONGO_URL'], os.environ['DB_NAME'], event_listeners=[CommandMetrics(metrics)])
+db = DatabaseHandle(database.primary)
+# Heavy analytics reads: separate pool, secondaryPreferred
+analytics_db = DatabaseHandle(database.analytics)
+
+app = FastAPI(default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # Models
 class Category(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
+    user_id: Optional[str] = None
     name: str
     icon: str
     color: str
@@ -39,6 +76,7 @@ class CategoryCreate(BaseModel):
 class Activity(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
+    user_id: Optional[str] = None
     category_id: str
     category_name: str
     date: str
@@ -58,11 +96,13 @@ class ActivityCreate(BaseModel):
 class Goal(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
+    user_id: Optional[str] = None
     category_id: str
     category_name: str
     target: int
-    period: str
-    current_progress: int = 0
+    period: str  # daily, weekly, monthly
+    current_progress: int = 0  # minutes logged in the current period window
+    window_start: Optional[str] = None
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
 class GoalCreate(BaseModel):
@@ -74,15 +114,21 @@ class GoalCreate(BaseModel):
 class Badge(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
+    user_id: Optional[str] = None
     name: str
     description: str
     icon: str
     earned_date: Optional[str] = None
     is_earned: bool = False
+    # Custom badges only; built-in badges have fixed conditions
+    condition_type: Optional[str] = None
+    condition_value: Optional[int] = None
+    category_id: Optional[str] = None
 
 class UserStats(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = "user_stats"
+    user_id: Optional[str] = None
     level: int = 1
     xp: int = 0
     total_activities: int = 0
@@ -94,183 +140,1272 @@ class UserStatsUpdate(BaseModel):
     xp: Optional[int] = None
     level: Optional[int] = None
 
-# Initialize default categories
-async def init_default_categories():
-    count = await db.categories.count_documents({})
-    if count == 0:
-        default_categories = [
-            {"id": "study", "name": "Study", "icon": "BookOpen", "color": "#3B82F6", "is_custom": False, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": "gaming", "name": "Gaming", "icon": "Gamepad2", "color": "#8B5CF6", "is_custom": False, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": "gym", "name": "Gym", "icon": "Dumbbell", "color": "#EF4444", "is_custom": False, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": "sleep", "name": "Sleep", "icon": "Moon", "color": "#6366F1", "is_custom": False, "created_at": datetime.now(timezone.utc).isoformat()},
-        ]
-        await db.categories.insert_many(default_categories)
+# Fast responses
+# FastAPI validates whatever a handler returns against its response_model,
+# building one model instance per item, unless the handler returns a Response
+# itself. Read endpoints fetch documents through a projection of exactly the
+# response model's fields and fill in its defaults, so the documents already
+# have the model's shape; they return them as an ORJSONResponse and skip the
+# per-item validation while the response_model still documents the schema.
+class ModelFields:
+    """Find projection of a response model's fields, and its constant defaults."""
+    
+    def __init__(self, model):
+        self.projection = {"_id": 0, **{name: 1 for name in model.model_fields}}
+        self.defaults = {
+            name: field.default for name, field in model.model_fields.items()
+            if not field.is_required() and field.default_factory is None
+        }
+    
+    def fill(self, documents: List[dict]) -> List[dict]:
+        for document in documents:
+            for name, value in self.defaults.items():
+                document.setdefault(name, value)
+        return documents
+    
+    def shape(self, document: dict) -> dict:
+        """A stored document (e.g. from a change stream) cut down to the model's fields."""
+        return self.fill([{name: document[name] for name in self.projection if name != "_id" and name in document}])[0]
 
-# Initialize user stats
-async def init_user_stats():
-    stats = await db.user_stats.find_one({"id": "user_stats"}, {"_id": 0})
-    if not stats:
-        default_stats = {
-            "id": "user_stats",
-            "level": 1,
-            "xp": 0,
-            "total_activities": 0,
-            "current_streak": 0,
-            "longest_streak": 0,
-            "last_activity_date": None
+CATEGORY_FIELDS = ModelFields(Category)
+ACTIVITY_FIELDS = ModelFields(Activity)
+GOAL_FIELDS = ModelFields(Goal)
+BADGE_FIELDS = ModelFields(Badge)
+USER_STATS_FIELDS = ModelFields(UserStats)
+
+# Response cache
+# Categories, badges and stats are read on every page load but only change on
+# explicit writes; they are cached per user and each write path invalidates
+# the affected user's key.
+cache = ReadThroughCache(ttl=float(os.environ.get('CACHE_TTL_SECONDS', '60')))
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+async def cached_response(request: Request, key: str, loader):
+    # Loaders return documents in their response model's shape (see ModelFields)
+    entry = await cache.get(key, loader)
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(entry.value, headers=headers)
+
+# Indexes
+# Every document belongs to a user, so every index leads with user_id: a
+# user's reads and writes touch only their own slice of each collection.
+# Documents are addressed by their application-level "id" within a user;
+# activities are additionally read by start minute (listing, clash check,
+# timeline, analytics), optionally within one category.
+INDEXES = {
+    "categories": [IndexModel([("user_id", ASCENDING), ("id", ASCENDING)], unique=True, name="user_id_id_unique")],
+    "activities": [
+        IndexModel([("user_id", ASCENDING), ("id", ASCENDING)], unique=True, name="user_id_id_unique"),
+        IndexModel([("user_id", ASCENDING), ("start_minute", ASCENDING), ("id", ASCENDING)], name="user_id_start_minute_id"),
+        IndexModel([("user_id", ASCENDING), ("category_id", ASCENDING), ("start_minute", ASCENDING), ("id", ASCENDING)], name="user_id_category_id_start_minute_id"),
+    ],
+    "goals": [
+        IndexModel([("user_id", ASCENDING), ("id", ASCENDING)], unique=True, name="user_id_id_unique"),
+        IndexModel([("user_id", ASCENDING), ("category_id", ASCENDING), ("period", ASCENDING), ("window_start", ASCENDING)], name="user_id_category_id_period_window_start"),
+    ],
+    "badges": [IndexModel([("user_id", ASCENDING), ("id", ASCENDING)], unique=True, name="user_id_id_unique")],
+    "user_stats": [IndexModel([("user_id", ASCENDING)], unique=True, name="user_id_unique")],
+    "daily_rollups": [
+        IndexModel([("user_id", ASCENDING), ("date", ASCENDING), ("category_id", ASCENDING)], unique=True, name="user_id_date_category_id"),
+        IndexModel([("user_id", ASCENDING), ("category_id", ASCENDING), ("date", ASCENDING)], name="user_id_category_id_date"),
+    ],
+    "activity_outbox": [
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+        IndexModel([("claimed_at", ASCENDING)], name="claimed_at"),
+    ],
+}
+
+# Single-user indexes from before user_id, whose unique ones would stop a
+# second user from being seeded with the built-in category and badge ids, and
+# the activity indexes on the schema 1 date/start_time strings.
+OBSOLETE_INDEXES = {
+    "categories": ["id_unique"],
+    "activities": [
+        "id_unique", "date_start_time_id", "category_id_date_start_time_id", "start_minute",
+        "user_id_date_start_time_id", "user_id_category_id_date_start_time_id", "user_id_start_minute",
+    ],
+    "goals": ["id_unique"],
+    "badges": ["id_unique"],
+    "user_stats": ["id_unique"],
+    "daily_rollups": ["date_category_id", "category_id_date"],
+}
+
+# Newest first; (start_minute, id) is unique so it doubles as the keyset
+ACTIVITY_SORT = [("start_minute", DESCENDING), ("id", DESCENDING)]
+
+# Query shapes issued by the handlers, as (name, collection, filter, sort).
+# Full listings of a user's small collections (get_categories, get_goals,
+# get_badges) are covered by the "by id" shapes' user_id prefix.
+_USER = {"user_id": "default"}
+QUERY_SHAPES = [
+    ("get_activities / dashboard recent", "activities", {**_USER}, ACTIVITY_SORT),
+    ("get_activities?category_id", "activities", {**_USER, "category_id": "study"}, ACTIVITY_SORT),
+    ("get_activities?start_date&end_date", "activities", {**_USER, "start_minute": {"$gte": 28401120, "$lt": 28926720}}, ACTIVITY_SORT),
+    ("get_activities?category_id&start_date&end_date", "activities", {**_USER, "category_id": "study", "start_minute": {"$gte": 28401120, "$lt": 28926720}}, ACTIVITY_SORT),
+    ("get_activities?cursor", "activities", {**_USER, "$or": [{"start_minute": {"$lt": 28620480}}, {"start_minute": 28620480, "id": {"$lt": "id"}}]}, ACTIVITY_SORT),
+    ("timeline", "activities", {**_USER, "start_minute": {"$gte": 28399680, "$lt": 28401120}, "end_minute": {"$gt": 28401120}}, [("start_minute", ASCENDING)]),
+    ("create_activity clash check", "activities", {**_USER, "start_minute": {"$gte": 28399680, "$lt": 28401150}, "end_minute": {"$gt": 28401120}}, [("start_minute", ASCENDING)]),
+    ("bulk import clash check", "activities", {**_USER, "$or": [{"start_minute": {"$gte": 28399680, "$lt": 28402560}}, {"start_minute": {"$gte": 28405440, "$lt": 28406880}}]}, [("start_minute", ASCENDING)]),
+    ("activity schema migration", "activities", {"_id": {"$gt": ObjectId("0" * 24)}, "schema": {"$ne": 2}}, [("_id", ASCENDING)]),
+    ("rollup $inc", "daily_rollups", {**_USER, "date": "2024-01-01", "category_id": "study"}, None),
+    ("analytics summary/daily", "daily_rollups", {**_USER, "date": {"$gte": "2024-01-01"}}, None),
+    ("analytics category", "daily_rollups", {**_USER, "category_id": "study", "date": {"$gte": "2024-01-01"}}, None),
+    ("goal progress $inc", "goals", {**_USER, "category_id": "study", "$or": [{"period": "daily", "window_start": "2024-06-05"}, {"period": "weekly", "window_start": "2024-06-03"}, {"period": "monthly", "window_start": "2024-06-01"}]}, None),
+    ("user_stats by user", "user_stats", {**_USER}, None),
+] + [
+    (f"{collection} by id", collection, {**_USER, "id": "id"}, None)
+    for collection in ("categories", "activities", "goals", "badges")
+]
+
+async def ensure_indexes():
+    async def ensure(collection: str):
+        if collection in OBSOLETE_INDEXES:
+            existing = await db[collection].index_information()
+            for name in OBSOLETE_INDEXES[collection]:
+                if name in existing:
+                    await db[collection].drop_index(name)
+        # create_indexes is a no-op for indexes that already exist with the same spec
+        await db[collection].create_indexes(INDEXES[collection])
+    
+    # Collections are independent, so they are bootstrapped concurrently
+    await asyncio.gather(*(ensure(collection) for collection in INDEXES))
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+async def check_query_plans():
+    """Explain every handler query shape and raise if any falls back to COLLSCAN."""
+    failures = []
+    for name, collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query, {"_id": 0})
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            failures.append(name)
+    if failures:
+        raise RuntimeError(f"Query shapes fall back to COLLSCAN: {', '.join(failures)}")
+
+# Daily rollups
+# daily_rollups holds one {user_id, date, category_id, category_name, duration,
+# count} document per user, day and category. It is kept current with $inc after
+# every activity write (see "Activity side effects") and is what the analytics
+# endpoints read.
+async def apply_rollup_changes(changes: List[tuple]):
+    """Apply (activity, sign) pairs to the rollups in one bulk_write; sign -1 takes a deleted activity back out."""
+    totals = defaultdict(lambda: {"duration": 0, "count": 0})
+    names = {}
+    for activity, sign in changes:
+        key = (activity["user_id"], activity["date"], activity["category_id"])
+        totals[key]["duration"] += sign * activity["duration"]
+        totals[key]["count"] += sign
+        names[key] = activity["category_name"]
+    # An activity created and deleted within one batch cancels out
+    totals = {key: total for key, total in totals.items() if total["count"] or total["duration"]}
+    if not totals:
+        return
+    await db.daily_rollups.bulk_write([
+        UpdateOne(
+            {"user_id": user_id, "date": date, "category_id": category_id},
+            {"$inc": total, "$set": {"category_name": names[(user_id, date, category_id)]}},
+            upsert=True
+        )
+        for (user_id, date, category_id), total in totals.items()
+    ], ordered=False)
+    emptied = [key for key, total in totals.items() if total["count"] < 0]
+    if emptied:
+        await db.daily_rollups.delete_many({"$or": [
+            {"user_id": user_id, "date": date, "category_id": category_id, "count": {"$lte": 0}}
+            for user_id, date, category_id in emptied
+        ]})
+    cache.invalidate(*{heatmap_cache_key(user_id, date[:4]) for user_id, date, _ in totals})
+
+async def apply_activities_to_rollups(activities: List[dict]):
+    await apply_rollup_changes([(activity, 1) for activity in activities])
+
+def heatmap_cache_key(user_id: str, year) -> str:
+    return f"heatmap:{user_id}:{year}"
+
+# Works on both activity schemas (see "Activity documents"): each activity is
+# counted on the day of its start_minute for end_minute - start_minute
+# minutes. Sorted by user so computed_rollups can name one user's categories
+# at a time.
+ROLLUP_PIPELINE = [
+    {"$group": {
+        "_id": {
+            "user_id": "$user_id",
+            "day": {"$floor": {"$divide": ["$start_minute", 24 * 60]}},
+            "category_id": "$category_id",
+        },
+        "category_name": {"$last": "$category_name"},
+        "duration": {"$sum": {"$subtract": ["$end_minute", "$start_minute"]}},
+        "count": {"$sum": 1},
+    }},
+    {"$sort": {"_id.user_id": 1}},
+]
+
+async def computed_rollups():
+    """daily_rollups documents recomputed from raw activities, grouped by user."""
+    user_id, names = None, {}
+    async for group in db.activities.aggregate(ROLLUP_PIPELINE, allowDiskUse=True):
+        key = group["_id"]
+        if key["user_id"] != user_id:
+            user_id = key["user_id"]
+            names = await load_category_names(user_id)
+        yield {
+            "user_id": user_id,
+            "date": _day_to_date(int(key["day"])),
+            "category_id": key["category_id"],
+            # Schema 2 activities only carry a name that differs from their category's
+            "category_name": group["category_name"] or names.get(key["category_id"], key["category_id"]),
+            "duration": group["duration"],
+            "count": group["count"],
         }
-        await db.user_stats.insert_one(default_stats)
-
-# Initialize badges
-async def init_badges():
-    count = await db.badges.count_documents({})
-    if count == 0:
-        default_badges = [
-            {"id": "first_step", "name": "First Step", "description": "Log your first activity", "icon": "Footprints", "is_earned": False},
-            {"id": "week_warrior", "name": "Week Warrior", "description": "Maintain a 7-day streak", "icon": "Flame", "is_earned": False},
-            {"id": "centurion", "name": "Centurion", "description": "Log 100 activities", "icon": "Trophy", "is_earned": False},
-            {"id": "level_5", "name": "Rising Star", "description": "Reach Level 5", "icon": "Star", "is_earned": False},
-            {"id": "level_10", "name": "Expert", "description": "Reach Level 10", "icon": "Award", "is_earned": False},
-            {"id": "month_master", "name": "Month Master", "description": "Maintain a 30-day streak", "icon": "Crown", "is_earned": False},
+
+async def rebuild_daily_rollups(batch_size: int = 5000):
+    """Recompute daily_rollups from raw activities.
+
+    The new rollups are built in a staging collection of this rebuild's own,
+    with the rollup indexes, and renamed over daily_rollups in one step, but
+    activity writes that land while they are computed may be missed; run
+    verify_daily_rollups afterwards if the API was live.
+    """
+    staging = db[f"daily_rollups_rebuild_{uuid.uuid4().hex}"]
+    try:
+        await staging.create_indexes(INDEXES["daily_rollups"])
+        batch = []
+        async for rollup in computed_rollups():
+            batch.append(rollup)
+            if len(batch) == batch_size:
+                await staging.insert_many(batch)
+                batch = []
+        if batch:
+            await staging.insert_many(batch)
+        await staging.rename("daily_rollups", dropTarget=True)
+    except BaseException:
+        await staging.drop()
+        raise
+    cache.invalidate_prefix("heatmap:")
+
+async def verify_daily_rollups() -> List[dict]:
+    """Diff daily_rollups against raw activities; returns the mismatching keys."""
+    expected = {
+        (row["user_id"], row["date"], row["category_id"]): (row["duration"], row["count"])
+        async for row in computed_rollups()
+    }
+    actual = {
+        (row["user_id"], row["date"], row["category_id"]): (row["duration"], row["count"])
+        async for row in db.daily_rollups.find({}, {"_id": 0})
+    }
+    mismatches = []
+    for key in sorted(expected.keys() | actual.keys()):
+        user_id, date, category_id = key
+        want = expected.get(key, (0, 0))
+        have = actual.get(key, (0, 0))
+        if want != have:
+            mismatches.append({
+                "user_id": user_id,
+                "date": date,
+                "category_id": category_id,
+                "expected": {"duration": want[0], "count": want[1]},
+                "actual": {"duration": have[0], "count": have[1]},
+            })
+    return mismatches
+
+# Activities whose stored fields cannot be read (older versions did not
+# validate date or start_time) are moved here with the reason, so one bad row
+# neither blocks startup nor stops the schema migration
+ACTIVITY_QUARANTINE = "activities_quarantine"
+
+async def quarantine_activities(documents: List[dict], reason: str):
+    if not documents:
+        return
+    quarantined_at = datetime.now(timezone.utc).isoformat()
+    # Upserts, so a crash between the two writes only repeats the first
+    await db[ACTIVITY_QUARANTINE].bulk_write([
+        ReplaceOne({"_id": document["_id"]}, {**document, "quarantine_reason": reason, "quarantined_at": quarantined_at}, upsert=True)
+        for document in documents
+    ])
+    await db.activities.delete_many({"_id": {"$in": [document["_id"] for document in documents]}})
+    logger.warning("Moved %d unreadable activities to %s: %s", len(documents), ACTIVITY_QUARANTINE, reason)
+
+# Backfill start_minute/end_minute on activities that predate them
+async def init_activity_minutes():
+    # A date or start_time that does not parse yields a null start_minute
+    # rather than failing the whole update
+    day_minutes = {"$divide": [
+        {"$subtract": [{"$dateFromString": {"dateString": "$date", "format": "%Y-%m-%d", "onError": None, "onNull": None}}, EPOCH]},
+        60 * 1000,
+    ]}
+    time_parts = {"$split": [{"$ifNull": ["$start_time", "00:00"]}, ":"]}
+
+    def time_part(index):
+        return {"$convert": {"input": {"$arrayElemAt": [time_parts, index]}, "to": "int", "onError": None, "onNull": None}}
+    start_minute = {"$convert": {
+        "input": {"$add": [day_minutes, {"$multiply": [time_part(0), 60]}, time_part(1)]},
+        "to": "long", "onError": None, "onNull": None,
+    }}
+    await db.activities.update_many(
+        {"start_minute": {"$exists": False}},
+        [
+            {"$set": {"start_minute": start_minute}},
+            {"$set": {"end_minute": {"$add": ["$start_minute", "$duration"]}}},
         ]
-        await db.badges.insert_many(default_badges)
+    )
+    unreadable = await db.activities.find({"start_minute": None}).to_list(None)
+    await quarantine_activities(unreadable, "date or start_time could not be parsed")
+
+# Backfill rollups for databases that predate them
+# The first build of daily_rollups is claimed through a migrations document,
+# so of several replicas bootstrapping at once only one builds; the others
+# wait for its rollups. A claim older than the lease (a replica that died
+# mid-build) may be taken over.
+ROLLUP_BUILD = "daily_rollups_build"
+ROLLUP_BUILD_LEASE_SECONDS = float(os.environ.get('ROLLUP_BUILD_LEASE_SECONDS', '900'))
+
+async def init_daily_rollups():
+    while not await db.daily_rollups.find_one({}, {"_id": 1}):
+        if not await db.activities.find_one({}, {"_id": 1}):
+            return
+        now = datetime.now(timezone.utc)
+        try:
+            await db.migrations.find_one_and_update(
+                {"_id": ROLLUP_BUILD, "claimed_at": {"$lt": (now - timedelta(seconds=ROLLUP_BUILD_LEASE_SECONDS)).isoformat()}},
+                {"$set": {"claimed_by": INSTANCE_ID, "claimed_at": now.isoformat()}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Another replica holds the claim
+            await asyncio.sleep(1)
+            continue
+        try:
+            await rebuild_daily_rollups()
+        finally:
+            await db.migrations.delete_one({"_id": ROLLUP_BUILD, "claimed_by": INSTANCE_ID})
+
+# Users
+# Every document carries its owner's user_id. Callers are identified by a
+# bearer token when JWT_SECRET is set, and otherwise by the X-User-Id header;
+# requests without either act as DEFAULT_USER_ID, which is also the user that
+# data from before multi-user support is migrated to.
+DEFAULT_USER_ID = os.environ.get('DEFAULT_USER_ID', 'default')
+JWT_SECRET = os.environ.get('JWT_SECRET')
+JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.@-]{1,128}$")
+
+USER_COLLECTIONS = ("categories", "activities", "goals", "badges", "user_stats", "daily_rollups")
+
+DEFAULT_CATEGORIES = [
+    {"id": "study", "name": "Study", "icon": "BookOpen", "color": "#3B82F6", "is_custom": False},
+    {"id": "gaming", "name": "Gaming", "icon": "Gamepad2", "color": "#8B5CF6", "is_custom": False},
+    {"id": "gym", "name": "Gym", "icon": "Dumbbell", "color": "#EF4444", "is_custom": False},
+    {"id": "sleep", "name": "Sleep", "icon": "Moon", "color": "#6366F1", "is_custom": False},
+]
+
+DEFAULT_BADGES = [
+    {"id": "first_step", "name": "First Step", "description": "Log your first activity", "icon": "Footprints", "is_earned": False},
+    {"id": "week_warrior", "name": "Week Warrior", "description": "Maintain a 7-day streak", "icon": "Flame", "is_earned": False},
+    {"id": "centurion", "name": "Centurion", "description": "Log 100 activities", "icon": "Trophy", "is_earned": False},
+    {"id": "level_5", "name": "Rising Star", "description": "Reach Level 5", "icon": "Star", "is_earned": False},
+    {"id": "level_10", "name": "Expert", "description": "Reach Level 10", "icon": "Award", "is_earned": False},
+    {"id": "month_master", "name": "Month Master", "description": "Maintain a 30-day streak", "icon": "Crown", "is_earned": False},
+]
+
+DEFAULT_USER_STATS = {
+    "id": "user_stats",
+    "level": 1,
+    "xp": 0,
+    "total_activities": 0,
+    "current_streak": 0,
+    "longest_streak": 0,
+    "last_activity_date": None,
+}
+
+async def seed_user(user_id: str) -> bool:
+    """Give a new user the default categories, badges and stats; returns whether the user is seeded.
+
+    The stats document is written last and marks the user as seeded, so
+    defaults the user later deletes are not brought back. Every write is an
+    upsert on the user's own keys, backed by a unique index, which makes
+    concurrent seeding (many replicas starting at once) harmless; categories
+    and badges are one bulk_write each, sent concurrently.
+
+    DEFAULT_USER_ID is not seeded while documents from before multi-user
+    support are still waiting for migrate_to_default_user: its defaults would
+    shadow that data and collide with it on the unique indexes.
+    """
+    if await db.user_stats.find_one({"user_id": user_id}, {"_id": 1}):
+        return True
+    if user_id == DEFAULT_USER_ID and await has_unowned_documents():
+        return False
+    created_at = datetime.now(timezone.utc).isoformat()
+    await asyncio.gather(
+        db.categories.bulk_write([
+            UpdateOne({"user_id": user_id, "id": category["id"]}, {"$setOnInsert": {**category, "created_at": created_at}}, upsert=True)
+            for category in DEFAULT_CATEGORIES
+        ], ordered=False),
+        db.badges.bulk_write([
+            UpdateOne({"user_id": user_id, "id": badge["id"]}, {"$setOnInsert": badge}, upsert=True)
+            for badge in DEFAULT_BADGES
+        ], ordered=False),
+    )
+    await db.user_stats.update_one({"user_id": user_id}, {"$setOnInsert": DEFAULT_USER_STATS}, upsert=True)
+    return True
+
+# Users this process has already seeded, so only a user's first request pays for it.
+# Least recently seen first; an evicted user only pays for one more no-op seed.
+SEEDED_USERS_CACHE_SIZE = int(os.environ.get('SEEDED_USERS_CACHE_SIZE', '10000'))
+_seeded_users: "OrderedDict[str, None]" = OrderedDict()
+
+async def ensure_user(user_id: str):
+    if user_id in _seeded_users:
+        _seeded_users.move_to_end(user_id)
+    elif await seed_user(user_id):
+        _seeded_users[user_id] = None
+        while len(_seeded_users) > SEEDED_USERS_CACHE_SIZE:
+            _seeded_users.popitem(last=False)
+
+async def has_unowned_documents() -> bool:
+    """Whether any document from before multi-user support still lacks a user_id."""
+    found = await asyncio.gather(*(
+        db[collection].find_one({"user_id": {"$exists": False}}, {"_id": 1}) for collection in USER_COLLECTIONS
+    ))
+    return any(found)
+
+async def migrate_to_default_user():
+    """Assign documents from before multi-user support to DEFAULT_USER_ID."""
+    await asyncio.gather(*(
+        db[collection].update_many({"user_id": {"$exists": False}}, {"$set": {"user_id": DEFAULT_USER_ID}})
+        for collection in USER_COLLECTIONS
+    ))
+
+def _user_id_from_token(authorization: Optional[str]) -> str:
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+    subject = claims.get("sub")
+    if not subject or not isinstance(subject, str):
+        raise HTTPException(status_code=401, detail="Token has no subject", headers={"WWW-Authenticate": "Bearer"})
+    return subject
+
+async def get_user_id(
+    x_user_id: Optional[str] = Header(None),
+    authorization: Optional[str] = Header(None),
+) -> str:
+    """Resolve the calling user and make sure they have been seeded.
+
+    Answers 503 until the startup bootstrap is done, so no request sees (or
+    seeds over) data that is still being migrated.
+    """
+    if not _ready:
+        raise HTTPException(status_code=503, detail="Starting up", headers={"Retry-After": "1"})
+    if JWT_SECRET:
+        user_id = _user_id_from_token(authorization)
+    else:
+        user_id = x_user_id or DEFAULT_USER_ID
+    if not user_id or not USER_ID_PATTERN.match(user_id):
+        raise HTTPException(status_code=400, detail="Invalid user id")
+    await ensure_user(user_id)
+    return user_id
+
+# Startup
+# Index bootstrap, migrations and seeding run in the background once the
+# client is connected, so the process answers /healthz straight away and
+# /readyz flips to ready when the bootstrap is done. A failed attempt (e.g.
+# the database not reachable yet) is logged and retried with backoff. Every
+# step is idempotent, and the one that must run once (the initial rollup
+# build) is claimed, so any number of replicas may bootstrap at once.
+_ready = False
+_bootstrap_error: Optional[str] = None
+_bootstrap_task: Optional[asyncio.Task] = None
+# Started once the bootstrap is done; cancelled on shutdown
+_background_tasks: List[asyncio.Task] = []
+
+async def bootstrap():
+    await ensure_indexes()
+    if os.environ.get('INDEX_SELF_CHECK', '').lower() in ('1', 'true', 'yes'):
+        await check_query_plans()
+    # Both backfill activities, in different fields
+    await asyncio.gather(migrate_to_default_user(), init_activity_minutes())
+    # Rollups are rebuilt from activities that now carry their user_id
+    await asyncio.gather(ensure_user(DEFAULT_USER_ID), init_daily_rollups(), enable_change_stream_pre_images())
+    await replay_activity_outbox()
+
+async def _bootstrap_until_done():
+    global _ready, _bootstrap_error
+    delay = 1.0
+    while True:
+        started = time.perf_counter()
+        try:
+            await bootstrap()
+        except Exception as exc:
+            _bootstrap_error = f"{type(exc).__name__}: {exc}"
+            logger.exception("Startup bootstrap failed, retrying in %.0fs", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+            continue
+        _ready, _bootstrap_error = True, None
+        logger.info("Startup bootstrap finished in %.0fms", (time.perf_counter() - started) * 1000)
+        if ACTIVITY_MIGRATION_ON_STARTUP:
+            # Long-running, and reads work on both schemas, so it does not hold up readiness
+            _background_tasks.append(asyncio.create_task(_migrate_activities_in_background()))
+        return
 
 @app.on_event("startup")
 async def startup_event():
-    await init_default_categories()
-    await init_user_stats()
-    await init_badges()
+    global _bootstrap_task
+    database.connect()
+    _bootstrap_task = asyncio.create_task(_bootstrap_until_done())
+
+# Probes
+READINESS_PING_TIMEOUT = float(os.environ.get('READINESS_PING_TIMEOUT_SECONDS', '2'))
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process is up and its event loop is serving requests."""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: the startup bootstrap has finished and the database answers a ping."""
+    if not _ready:
+        return ORJSONResponse({"status": "starting", "error": _bootstrap_error}, status_code=503)
+    try:
+        await asyncio.wait_for(db.command("ping"), READINESS_PING_TIMEOUT)
+    except (asyncio.TimeoutError, PyMongoError) as exc:
+        return ORJSONResponse({"status": "database unavailable", "error": f"{type(exc).__name__}: {exc}"}, status_code=503)
+    return {"status": "ready"}
 
 # Categories endpoints
+# Deleting a category only marks it deleted: schema 2 activities look their
+# category's name up by id (see "Activity documents"), including after the
+# category is gone.
+LIVE_CATEGORY = {"deleted": {"$ne": True}}
+
+def categories_cache_key(user_id: str) -> str:
+    return f"categories:{user_id}"
+
+def category_names_cache_key(user_id: str) -> str:
+    return f"category_names:{user_id}"
+
+async def load_categories(user_id: str):
+    return CATEGORY_FIELDS.fill(await db.categories.find({"user_id": user_id, **LIVE_CATEGORY}, CATEGORY_FIELDS.projection).to_list(100))
+
+async def load_category_names(user_id: str) -> dict:
+    """Names of all the user's categories, deleted ones included, by id."""
+    categories = await db.categories.find({"user_id": user_id}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    return {category["id"]: category["name"] for category in categories}
+
 @api_router.get("/categories", response_model=List[Category])
-async def get_categories():
-    categories = await db.categories.find({}, {"_id": 0}).to_list(100)
-    return categories
+async def get_categories(request: Request, user_id: str = Depends(get_user_id)):
+    return await cached_response(request, categories_cache_key(user_id), lambda: load_categories(user_id))
 
 @api_router.post("/categories", response_model=Category)
-async def create_category(category: CategoryCreate):
-    import uuid
+async def create_category(category: CategoryCreate, user_id: str = Depends(get_user_id)):
     category_dict = category.model_dump()
     category_dict["id"] = str(uuid.uuid4())
+    category_dict["user_id"] = user_id
     category_dict["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.categories.insert_one(category_dict)
+    cache.invalidate(categories_cache_key(user_id), category_names_cache_key(user_id))
     return Category(**category_dict)
 
 @api_router.delete("/categories/{category_id}")
-async def delete_category(category_id: str):
-    result = await db.categories.delete_one({"id": category_id})
-    if result.deleted_count == 0:
+async def delete_category(category_id: str, user_id: str = Depends(get_user_id)):
+    result = await db.categories.update_one(
+        {"user_id": user_id, "id": category_id, **LIVE_CATEGORY},
+        {"$set": {"deleted": True, "deleted_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    cache.invalidate(categories_cache_key(user_id))
     return {"message": "Category deleted"}
 
 # Activities endpoints
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+MINUTES_PER_DAY = 24 * 60
+# The timeline, hourly and clash-check windows look back one day for
+# activities spilling over from the day before, so none may last longer
+MAX_ACTIVITY_DURATION = MINUTES_PER_DAY
+DURATION_ERROR = f"Duration must be between 1 and {MAX_ACTIVITY_DURATION} minutes"
+
+def activity_interval(date: str, start_time: str, duration: int):
+    """Return (start_minute, end_minute) as absolute minutes since the epoch."""
+    day = datetime.strptime(date, "%Y-%m-%d")
+    hour, minute = map(int, start_time.split(':'))
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid start time: {start_time}")
+    start = (day - EPOCH).days * MINUTES_PER_DAY + hour * 60 + minute
+    return start, start + duration
+
+def _minutes_to_time(minute_of_day: int) -> str:
+    return f"{minute_of_day // 60:02d}:{minute_of_day % 60:02d}"
+
+def _parse_date(value: str) -> datetime:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+def start_minute_range(start_date: Optional[str], end_date: Optional[str]) -> dict:
+    """start_minute bounds matching activities dated from start_date through end_date (either may be open)."""
+    bounds = {}
+    if start_date:
+        bounds["$gte"] = (_parse_date(start_date) - EPOCH).days * MINUTES_PER_DAY
+    if end_date:
+        bounds["$lt"] = ((_parse_date(end_date) - EPOCH).days + 1) * MINUTES_PER_DAY
+    return bounds
+
+# Activity documents
+# The API shape of an activity (Activity) carries its date, "HH:MM" start
+# time and duration as written, and the category's name. Schema 1 documents
+# (no `schema` field) stored exactly that, plus start_minute/end_minute.
+# Schema 2 documents store integers only: `day` (days since the epoch),
+# start_minute and end_minute, with created_at as a BSON date; date,
+# start_time and duration are derived on read, and the category name is
+# looked up by category_id unless the activity was written with a different
+# one. Both schemas are read until migrate_activities has rewritten every
+# schema 1 document, and all activity queries filter and sort on
+# start_minute, which both carry.
+ACTIVITY_SCHEMA = 2
+
+def activity_document(activity: dict, category_names: dict) -> dict:
+    """The schema 2 document for an API-shaped activity that has its start_minute/end_minute."""
+    start_minute = activity["start_minute"]
+    document = {
+        "schema": ACTIVITY_SCHEMA,
+        "id": activity["id"],
+        "user_id": activity["user_id"],
+        "category_id": activity["category_id"],
+        "day": start_minute // MINUTES_PER_DAY,
+        "start_minute": start_minute,
+        "end_minute": activity["end_minute"],
+        "created_at": datetime.fromisoformat(activity["created_at"]),
+    }
+    if category_names.get(activity["category_id"]) != activity["category_name"]:
+        document["category_name"] = activity["category_name"]
+    if activity.get("notes") is not None:
+        document["notes"] = activity["notes"]
+    return document
+
+@functools.lru_cache(maxsize=4096)
+def _day_to_date(day: int) -> str:
+    return datetime.fromordinal(EPOCH_ORDINAL + day).date().isoformat()
+
+def activity_from_document(document: dict, category_names: dict) -> dict:
+    """The API shape of a stored schema 1 or schema 2 activity."""
+    if document.get("schema") != ACTIVITY_SCHEMA:
+        return ACTIVITY_FIELDS.shape(document)
+    day, start_minute = document["day"], document["start_minute"]
+    category_id = document["category_id"]
+    return {
+        "id": document["id"],
+        "user_id": document["user_id"],
+        "category_id": category_id,
+        "category_name": document["category_name"] if "category_name" in document else category_names.get(category_id, category_id),
+        "date": _day_to_date(day),
+        "start_time": _minutes_to_time(start_minute - day * MINUTES_PER_DAY),
+        "duration": document["end_minute"] - start_minute,
+        "notes": document.get("notes"),
+        # Read back as naive UTC
+        "created_at": document["created_at"].isoformat(timespec="milliseconds") + "+00:00",
+    }
+
+async def get_category_names(user_id: str, documents: List[dict] = ()) -> dict:
+    """The user's category names, fresh enough to name every one of `documents`.
+
+    The cached names may predate a category created through another process;
+    a document naming a category they lack has them reloaded.
+    """
+    key = category_names_cache_key(user_id)
+    names = (await cache.get(key, lambda: load_category_names(user_id))).value
+    if any("category_name" not in document and document["category_id"] not in names for document in documents):
+        cache.invalidate(key)
+        names = (await cache.get(key, lambda: load_category_names(user_id))).value
+    return names
+
+async def activities_from_documents(user_id: str, documents: List[dict]) -> List[dict]:
+    names = await get_category_names(user_id, documents)
+    return [activity_from_document(document, names) for document in documents]
+
+async def activity_batches(user_id: str, cursor, size: int):
+    """API-shaped activities from a cursor over the user's stored ones, `size` at a time."""
+    while True:
+        documents = await cursor.to_list(size)
+        if not documents:
+            return
+        yield await activities_from_documents(user_id, documents)
+
+def clash_filter(user_id: str, start_minute: int, end_minute: int) -> dict:
+    # Nothing lasts longer than MAX_ACTIVITY_DURATION, so any overlapping
+    # activity starts in this bounded range. Stored activities may overlap
+    # each other (concurrent creates, legacy rows), so every one in the range
+    # is checked rather than only the last to start.
+    return {
+        "user_id": user_id,
+        "start_minute": {"$gte": start_minute - MAX_ACTIVITY_DURATION, "$lt": end_minute},
+        "end_minute": {"$gt": start_minute},
+    }
+
+async def find_clashing_activity(user_id: str, start_minute: int, end_minute: int) -> Optional[dict]:
+    candidates = await db.activities.find(
+        clash_filter(user_id, start_minute, end_minute), {"_id": 0}
+    ).sort("start_minute", ASCENDING).limit(1).to_list(1)
+    return candidates[0] if candidates else None
+
+async def clash_message(user_id: str, document: dict) -> str:
+    clash = (await activities_from_documents(user_id, [document]))[0]
+    return f"Activity clashes with existing {clash['category_name']} from {clash['start_time']} ({clash['duration']}m)"
+
+ACTIVITIES_PAGE_SIZE = int(os.environ.get('ACTIVITIES_PAGE_SIZE', '1000'))
+ACTIVITIES_MAX_PAGE_SIZE = int(os.environ.get('ACTIVITIES_MAX_PAGE_SIZE', '5000'))
+ACTIVITIES_STREAM_BATCH_SIZE = int(os.environ.get('ACTIVITIES_STREAM_BATCH_SIZE', '500'))
+
+def encode_activity_cursor(document: dict) -> str:
+    key = [document["start_minute"], document["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_activity_cursor(cursor: str) -> dict:
+    try:
+        start_minute, activity_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Decoded values go straight into the filter, so anything other than the
+    # [int, str] we encode (e.g. an operator document, or an int BSON cannot
+    # hold) is rejected
+    if type(start_minute) is not int or not -2**63 <= start_minute < 2**63 or not isinstance(activity_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Strictly after the cursor in ACTIVITY_SORT order
+    return {"$or": [
+        {"start_minute": {"$lt": start_minute}},
+        {"start_minute": start_minute, "id": {"$lt": activity_id}},
+    ]}
+
+async def stream_ndjson(batches):
+    async for batch in batches:
+        yield b"".join(orjson.dumps(document) + b"\n" for document in batch)
+
 @api_router.get("/activities", response_model=List[Activity])
-async def get_activities(category_id: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None):
-    query = {}
+async def get_activities(
+    category_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(ACTIVITIES_PAGE_SIZE, ge=1, le=ACTIVITIES_MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    user_id: str = Depends(get_user_id),
+):
+    query = {"user_id": user_id}
     if category_id:
         query["category_id"] = category_id
     if start_date and end_date:
-        query["date"] = {"$gte": start_date, "$lte": end_date}
-    activities = await db.activities.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
-    return activities
+        query["start_minute"] = start_minute_range(start_date, end_date)
+    if cursor:
+        query = {"$and": [query, decode_activity_cursor(cursor)]}
+
+    if format == "ndjson":
+        # Every matching activity, written out as the Motor cursor yields each batch
+        documents = db.activities.find(query, {"_id": 0}).sort(ACTIVITY_SORT).batch_size(ACTIVITIES_STREAM_BATCH_SIZE)
+        return StreamingResponse(
+            stream_ndjson(activity_batches(user_id, documents, ACTIVITIES_STREAM_BATCH_SIZE)), media_type="application/x-ndjson"
+        )
+
+    # Fetch one extra row to learn whether another page exists
+    documents = await db.activities.find(query, {"_id": 0}).sort(ACTIVITY_SORT).limit(limit + 1).to_list(limit + 1)
+    headers = {}
+    if len(documents) > limit:
+        documents = documents[:limit]
+        headers["X-Next-Cursor"] = encode_activity_cursor(documents[-1])
+    return ORJSONResponse(await activities_from_documents(user_id, documents), headers=headers)
 
 @api_router.post("/activities", response_model=Activity)
-async def create_activity(activity: ActivityCreate):
-    import uuid
-    
-    # Validate time format
+async def create_activity(activity: ActivityCreate, user_id: str = Depends(get_user_id)):
+    # Validate date and time format
     try:
-        hour, minute = map(int, activity.start_time.split(':'))
-        if not (0 <= hour < 24 and 0 <= minute < 60):
-            raise ValueError()
-    except:
-        raise HTTPException(status_code=400, detail="Invalid time format. Use HH:MM (24-hour)")
-    
-    # Check for activity clashes
-    start_hour = hour
-    start_minute = minute
-    end_minutes = start_minute + activity.duration
-    end_hour = start_hour + (end_minutes // 60)
-    end_minute = end_minutes % 60
-    
-    # Query activities on the same date
-    existing_activities = await db.activities.find({
-        "date": activity.date
-    }, {"_id": 0}).to_list(1000)
-    
-    # Check for overlaps
-    for existing in existing_activities:
-        ex_hour, ex_minute = map(int, existing['start_time'].split(':'))
-        ex_start_minutes = ex_hour * 60 + ex_minute
-        ex_end_minutes = ex_start_minutes + existing['duration']
-        
-        new_start_minutes = start_hour * 60 + start_minute
-        new_end_minutes = new_start_minutes + activity.duration
-        
-        # Check if there's an overlap
-        if not (new_end_minutes <= ex_start_minutes or new_start_minutes >= ex_end_minutes):
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Activity clashes with existing {existing['category_name']} from {existing['start_time']} ({existing['duration']}m)"
-            )
+        start_minute, end_minute = activity_interval(activity.date, activity.start_time, activity.duration)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date or time format. Use YYYY-MM-DD and HH:MM (24-hour)")
+    if not 0 < activity.duration <= MAX_ACTIVITY_DURATION:
+        raise HTTPException(status_code=400, detail=DURATION_ERROR)
+    
+    # Check for activity clashes, including spill-over from the previous day
+    existing = await find_clashing_activity(user_id, start_minute, end_minute)
+    if existing:
+        raise HTTPException(status_code=400, detail=await clash_message(user_id, existing))
     
     activity_dict = activity.model_dump()
     activity_dict["id"] = str(uuid.uuid4())
-    activity_dict["created_at"] = datetime.now(timezone.utc).isoformat()
-    await db.activities.insert_one(activity_dict)
-    
-    # Update user stats
-    await update_user_stats_on_activity(activity_dict["date"], activity_dict["duration"])
+    activity_dict["user_id"] = user_id
+    activity_dict["start_minute"] = start_minute
+    activity_dict["end_minute"] = end_minute
+    # Milliseconds, as stored
+    activity_dict["created_at"] = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+    await db.activities.insert_one(activity_document(activity_dict, await get_category_names(user_id)))
     
-    # Check and update badges
-    await check_badges()
+    # Rollups, goals, stats and badges catch up in the background
+    await queue_activity_effects(user_id, activity_effect(activity_dict, 1))
     
     return Activity(**activity_dict)
 
+# Bulk import
+BULK_IMPORT_CHUNK_SIZE = int(os.environ.get('BULK_IMPORT_CHUNK_SIZE', '1000'))
+
+def _decode_line(line: bytes):
+    # Lines are split on bytes first, so a multi-byte character never straddles
+    # two; a line that still fails to decode is returned as its row's error
+    try:
+        return line.decode("utf-8").rstrip("\r")
+    except UnicodeDecodeError as e:
+        return ValueError(f"Not valid UTF-8 ({e.reason} at byte {e.start})")
+
+async def _iter_lines(request: Request):
+    """The upload's lines as strings, or a ValueError for a line that is not valid UTF-8."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield _decode_line(line)
+    if buffer:
+        yield _decode_line(buffer)
+
+async def _iter_json_rows(request: Request):
+    try:
+        rows = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body is not valid JSON")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of activities")
+    for row in rows:
+        yield row
+
+async def _iter_ndjson_rows(request: Request):
+    async for line in _iter_lines(request):
+        if isinstance(line, ValueError):
+            yield line
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            # Reported against this row rather than failing the whole upload
+            yield e
+
+async def _iter_csv_rows(request: Request):
+    header = None
+    record = ""
+    async for line in _iter_lines(request):
+        if isinstance(line, ValueError):
+            if header is None:
+                raise HTTPException(status_code=400, detail=f"CSV header is malformed: {line}")
+            # Drops the record it belongs to, which is reported as one row
+            record = ""
+            yield line
+            continue
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            # A quoted field continues on the next line
+            continue
+        values = next(csv.reader([record]), [])
+        record = ""
+        if not values:
+            continue
+        if header is None:
+            header = [value.strip().lstrip("\ufeff") for value in values]
+            continue
+        yield {key: value if value != "" else None for key, value in zip(header, values)}
+
+IMPORT_READERS = {
+    "application/json": _iter_json_rows,
+    "application/x-ndjson": _iter_ndjson_rows,
+    "text/csv": _iter_csv_rows,
+}
+
+def _validate_import_row(row, user_id: str) -> dict:
+    if isinstance(row, Exception):
+        raise ValueError(f"Malformed row: {row}")
+    activity = ActivityCreate.model_validate(row)
+    try:
+        start_minute, end_minute = activity_interval(activity.date, activity.start_time, activity.duration)
+    except ValueError:
+        raise ValueError("Invalid date or time format. Use YYYY-MM-DD and HH:MM (24-hour)")
+    if not 0 < activity.duration <= MAX_ACTIVITY_DURATION:
+        raise ValueError(DURATION_ERROR)
+    activity_dict = activity.model_dump()
+    activity_dict["id"] = str(uuid.uuid4())
+    activity_dict["user_id"] = user_id
+    activity_dict["start_minute"] = start_minute
+    activity_dict["end_minute"] = end_minute
+    activity_dict["created_at"] = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+    return activity_dict
+
+def _describe_row_error(error: ValueError) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+async def _import_chunk(user_id: str, rows):
+    """Clash-check and insert one chunk of (row_number, activity) pairs for a user.
+
+    Returns the inserted activities and the per-row errors.
+    """
+    errors = []
+    
+    # Existing activities on every day a row covers (a row can run past
+    # midnight), plus the days an activity spilling into it can start on, as
+    # one start_minute range per run of consecutive days
+    days = set()
+    for _, activity in rows:
+        days.update(range(
+            (activity["start_minute"] - MAX_ACTIVITY_DURATION) // MINUTES_PER_DAY,
+            (activity["end_minute"] - 1) // MINUTES_PER_DAY + 1,
+        ))
+    ranges = []
+    for day in sorted(days):
+        if ranges and ranges[-1][1] == day * MINUTES_PER_DAY:
+            ranges[-1][1] += MINUTES_PER_DAY
+        else:
+            ranges.append([day * MINUTES_PER_DAY, (day + 1) * MINUTES_PER_DAY])
+    existing = await db.activities.find(
+        {"user_id": user_id, "$or": [{"start_minute": {"$gte": start, "$lt": end}} for start, end in ranges]}, {"_id": 0}
+    ).sort("start_minute", ASCENDING).to_list(None)
+    existing_starts = [activity["start_minute"] for activity in existing]
+    
+    # Sweep the chunk in start order. Stored activities may overlap each
+    # other, so every one starting in the row's clash range is checked; the
+    # accepted rows never overlap, so the last one is the only one a later
+    # row can clash with
+    accepted = []
+    for row_number, activity in sorted(rows, key=lambda row: row[1]["start_minute"]):
+        first = bisect.bisect_left(existing_starts, activity["start_minute"] - MAX_ACTIVITY_DURATION)
+        last = bisect.bisect_left(existing_starts, activity["end_minute"])
+        clash = next((other for other in existing[first:last] if other["end_minute"] > activity["start_minute"]), None)
+        if clash:
+            errors.append({"row": row_number, "error": await clash_message(user_id, clash)})
+        elif accepted and accepted[-1][1]["end_minute"] > activity["start_minute"]:
+            errors.append({"row": row_number, "error": f"Activity clashes with row {accepted[-1][0]}"})
+        else:
+            accepted.append((row_number, activity))
+    
+    documents = [activity for _, activity in accepted]
+    if not documents:
+        return [], errors
+    category_names = await get_category_names(user_id)
+    try:
+        await db.activities.insert_many([activity_document(activity, category_names) for activity in documents], ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"]: error["errmsg"] for error in e.details["writeErrors"]}
+        errors.extend({"row": accepted[index][0], "error": message} for index, message in failed.items())
+        documents = [activity for index, activity in enumerate(documents) if index not in failed]
+    await apply_activities_to_rollups(documents)
+    await apply_activities_to_goals(documents)
+    return documents, errors
+
+@api_router.post("/activities/bulk")
+async def import_activities(request: Request, user_id: str = Depends(get_user_id)):
+    """Import many activities from a JSON array, NDJSON or CSV upload.
+
+    Rows are validated and clash-checked in chunks; the stats, streaks and
+    badges update is queued once at the end. Returns a per-row error report.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in IMPORT_READERS:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type. Use one of: {', '.join(IMPORT_READERS)}")
+    
+    received = 0
+    inserted = []
+    errors = []
+    chunk = []
+    async for row in IMPORT_READERS[content_type](request):
+        received += 1
+        try:
+            chunk.append((received, _validate_import_row(row, user_id)))
+        except ValueError as e:
+            errors.append({"row": received, "error": _describe_row_error(e)})
+        if len(chunk) >= BULK_IMPORT_CHUNK_SIZE:
+            documents, chunk_errors = await _import_chunk(user_id, chunk)
+            inserted.extend((activity["date"], activity["duration"]) for activity in documents)
+            errors.extend(chunk_errors)
+            chunk = []
+    if chunk:
+        documents, chunk_errors = await _import_chunk(user_id, chunk)
+        inserted.extend((activity["date"], activity["duration"]) for activity in documents)
+        errors.extend(chunk_errors)
+    
+    if inserted:
+        await queue_activity_effects(user_id, {
+            "imported": len(inserted),
+            "minutes": sum(duration for _, duration in inserted),
+            "dates": sorted({date for date, _ in inserted}),
+        })
+    
+    errors.sort(key=lambda error: error["row"])
+    return {"received": received, "inserted": len(inserted), "failed": len(errors), "errors": errors}
+
 @api_router.delete("/activities/{activity_id}")
-async def delete_activity(activity_id: str):
-    result = await db.activities.delete_one({"id": activity_id})
-    if result.deleted_count == 0:
+async def delete_activity(activity_id: str, user_id: str = Depends(get_user_id)):
+    document = await db.activities.find_one_and_delete({"user_id": user_id, "id": activity_id}, {"_id": 0})
+    if not document:
         raise HTTPException(status_code=404, detail="Activity not found")
+    activity = (await activities_from_documents(user_id, [document]))[0]
+    await queue_activity_effects(user_id, activity_effect(activity, -1))
     return {"message": "Activity deleted"}
 
-# Goals endpoints
+# Activity schema migration
+# Rewrites schema 1 activities as schema 2 (see "Activity documents") in _id
+# order, a batch at a time, and records the last _id done in `migrations`, so
+# an interrupted run resumes where it stopped. Each rewrite keeps the
+# document's _id and only applies while it is still schema 1, which makes
+# concurrent runs (every replica starts one after its bootstrap) harmless.
+# Readers handle both schemas meanwhile.
+ACTIVITY_MIGRATION = "activities_schema_2"
+ACTIVITY_MIGRATION_BATCH_SIZE = int(os.environ.get('ACTIVITY_MIGRATION_BATCH_SIZE', '1000'))
+# Pause between batches of the background run, leaving room for API traffic
+ACTIVITY_MIGRATION_PAUSE = float(os.environ.get('ACTIVITY_MIGRATION_PAUSE_SECONDS', '0.05'))
+ACTIVITY_MIGRATION_ON_STARTUP = os.environ.get('ACTIVITY_MIGRATION_ON_STARTUP', '1').lower() in ('1', 'true', 'yes')
+
+async def _category_names_by_user(user_ids) -> dict:
+    names = defaultdict(dict)
+    async for category in db.categories.find({"user_id": {"$in": list(user_ids)}}, {"_id": 0, "user_id": 1, "id": 1, "name": 1}):
+        names[category["user_id"]][category["id"]] = category["name"]
+    return names
+
+async def migrate_activities(batch_size: int = ACTIVITY_MIGRATION_BATCH_SIZE, pause: float = 0.0, restart: bool = False) -> int:
+    """Rewrite schema 1 activities as schema 2; returns how many this run rewrote.
+
+    Resumes from the recorded checkpoint unless `restart` is set, and does
+    nothing once a run has found no schema 1 activities left.
+    """
+    if restart:
+        await db.migrations.delete_one({"_id": ACTIVITY_MIGRATION})
+    state = await db.migrations.find_one({"_id": ACTIVITY_MIGRATION}) or {}
+    if state.get("done"):
+        return 0
+    last_id = state.get("last_id")
+    migrated = 0
+    while True:
+        query = {"schema": {"$ne": ACTIVITY_SCHEMA}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db.activities.find(query).sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+        if not batch:
+            await db.migrations.update_one(
+                {"_id": ACTIVITY_MIGRATION},
+                {"$set": {"done": True, "finished_at": datetime.now(timezone.utc).isoformat()}},
+                upsert=True
+            )
+            return migrated
+        names = await _category_names_by_user({document["user_id"] for document in batch})
+        replacements = []
+        for document in batch:
+            try:
+                if document.get("start_minute") is None:
+                    document["start_minute"], document["end_minute"] = activity_interval(document["date"], document["start_time"], document["duration"])
+                replacements.append(ReplaceOne(
+                    {"_id": document["_id"], "schema": {"$ne": ACTIVITY_SCHEMA}},
+                    activity_document(document, names[document["user_id"]])
+                ))
+            except (KeyError, TypeError, ValueError) as e:
+                await quarantine_activities([document], f"schema {ACTIVITY_SCHEMA} migration failed: {type(e).__name__}: {e}")
+        result = await db.activities.bulk_write(replacements, ordered=False) if replacements else None
+        last_id = batch[-1]["_id"]
+        await db.migrations.update_one(
+            {"_id": ACTIVITY_MIGRATION},
+            {"$max": {"last_id": last_id}, "$inc": {"migrated": result.modified_count if result else 0}},
+            upsert=True
+        )
+        migrated += result.modified_count if result else 0
+        await asyncio.sleep(pause)
+
+async def _migrate_activities_in_background():
+    try:
+        migrated = await migrate_activities(pause=ACTIVITY_MIGRATION_PAUSE)
+    except Exception:
+        # Picked up from the checkpoint by the next process to start
+        logger.exception("Activity schema migration failed")
+        return
+    if migrated:
+        logger.info("Migrated %d activities to schema %d", migrated, ACTIVITY_SCHEMA)
+
+# Goals
+# A goal's current_progress is the minutes logged in its category during the
+# period window starting at window_start. Activity writes $inc the goals whose
+# window contains the activity; once the window moves on, the next read
+# recomputes the goal for the new window from daily_rollups. The recompute
+# runs on the user's activity effects worker, between batches, so no $inc can
+# land between its rollup read and its write and be lost or counted twice.
+GOAL_PERIODS = ("daily", "weekly", "monthly")
+
+def goal_window(period: str, day) -> tuple:
+    """Return the [start, end) dates, as ISO strings, of the `period` window containing `day`."""
+    if period == "weekly":
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(days=7)
+    elif period == "monthly":
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+    else:
+        start, end = day, day + timedelta(days=1)
+    return start.isoformat(), end.isoformat()
+
+def _goal_filter(activity: dict) -> dict:
+    day = datetime.strptime(activity["date"], "%Y-%m-%d").date()
+    return {
+        "user_id": activity["user_id"],
+        "category_id": activity["category_id"],
+        "$or": [{"period": period, "window_start": goal_window(period, day)[0]} for period in GOAL_PERIODS],
+    }
+
+async def apply_goal_changes(changes: List[tuple]):
+    """Apply (activity, sign) pairs to the progress of the goals whose window they fall in."""
+    totals = defaultdict(int)
+    for activity, sign in changes:
+        totals[(activity["user_id"], activity["date"], activity["category_id"])] += sign * activity["duration"]
+    totals = {key: duration for key, duration in totals.items() if duration}
+    if totals:
+        await db.goals.bulk_write([
+            UpdateMany(
+                _goal_filter({"user_id": user_id, "date": date, "category_id": category_id}),
+                {"$inc": {"current_progress": duration}}
+            )
+            for (user_id, date, category_id), duration in totals.items()
+        ], ordered=False)
+
+async def apply_activities_to_goals(activities: List[dict]):
+    await apply_goal_changes([(activity, 1) for activity in activities])
+
+async def refresh_goal_progress(user_id: str, goals: List[dict], today):
+    """Recompute the goals' progress for the windows containing `today`, in place.
+
+    Reads the user's rollups for all the windows in one query and writes the
+    results back in one bulk_write. Each write is conditional on the
+    window_start it replaces, so concurrent refreshes of the same goal agree.
+    """
+    goals = [goal for goal in goals if goal["period"] in GOAL_PERIODS]
+    if not goals:
+        return
+    windows = {goal["id"]: goal_window(goal["period"], today) for goal in goals}
+    rollups = await db.daily_rollups.find(
+        {
+            "user_id": user_id,
+            "category_id": {"$in": sorted({goal["category_id"] for goal in goals})},
+            "date": {"$gte": min(start for start, _ in windows.values()), "$lt": max(end for _, end in windows.values())},
+        },
+        {"_id": 0, "category_id": 1, "date": 1, "duration": 1}
+    ).to_list(None)
+    minutes_by_category = defaultdict(list)
+    for rollup in rollups:
+        minutes_by_category[rollup["category_id"]].append((rollup["date"], rollup["duration"]))
+    
+    updates = []
+    for goal in goals:
+        start, end = windows[goal["id"]]
+        progress = sum(duration for date, duration in minutes_by_category[goal["category_id"]] if start <= date < end)
+        updates.append(UpdateOne(
+            {"user_id": user_id, "id": goal["id"], "window_start": goal.get("window_start")},
+            {"$set": {"window_start": start, "current_progress": progress}}
+        ))
+        goal["window_start"], goal["current_progress"] = start, progress
+    await db.goals.bulk_write(updates, ordered=False)
+
+async def refresh_goals(user_id: str, goals: List[dict], today):
+    """refresh_goal_progress on the user's activity effects worker, after the effects already queued."""
+    done = asyncio.get_running_loop().create_future()
+    activity_effects.submit(user_id, {"refresh_goals": goals, "today": today, "done": done})
+    await done
+
+async def recompute_goal_progress(user_id: Optional[str] = None) -> int:
+    """Recompute every goal (or one user's) from daily_rollups; returns how many were checked."""
+    query = {"user_id": user_id} if user_id else {}
+    goals_by_user = defaultdict(list)
+    async for goal in db.goals.find(query, {"_id": 0}):
+        goals_by_user[goal["user_id"]].append(goal)
+    today = datetime.now(timezone.utc).date()
+    for goal_user_id, goals in goals_by_user.items():
+        await refresh_goal_progress(goal_user_id, goals, today)
+    return sum(len(goals) for goals in goals_by_user.values())
+
 @api_router.get("/goals", response_model=List[Goal])
-async def get_goals():
-    goals = await db.goals.find({}, {"_id": 0}).to_list(100)
-    return goals
+async def get_goals(user_id: str = Depends(get_user_id)):
+    goals = GOAL_FIELDS.fill(await db.goals.find({"user_id": user_id}, GOAL_FIELDS.projection).to_list(None))
+    # Roll goals whose window has ended over to the current one
+    today = datetime.now(timezone.utc).date()
+    stale = [
+        goal for goal in goals
+        if goal["period"] in GOAL_PERIODS and goal.get("window_start") != goal_window(goal["period"], today)[0]
+    ]
+    if stale:
+        await refresh_goals(user_id, stale, today)
+    return ORJSONResponse(goals)
 
 @api_router.post("/goals", response_model=Goal)
-async def create_goal(goal: GoalCreate):
-    import uuid
+async def create_goal(goal: GoalCreate, user_id: str = Depends(get_user_id)):
+    if goal.period not in GOAL_PERIODS:
+        raise HTTPException(status_code=400, detail=f"Period must be one of: {', '.join(GOAL_PERIODS)}")
     goal_dict = goal.model_dump()
     goal_dict["id"] = str(uuid.uuid4())
+    goal_dict["user_id"] = user_id
     goal_dict["current_progress"] = 0
+    goal_dict["window_start"] = None
     goal_dict["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.goals.insert_one(goal_dict)
+    # Count what was already logged in the current window
+    await refresh_goals(user_id, [goal_dict], datetime.now(timezone.utc).date())
     return Goal(**goal_dict)
 
 @api_router.delete("/goals/{goal_id}")
-async def delete_goal(goal_id: str):
-    result = await db.goals.delete_one({"id": goal_id})
+async def delete_goal(goal_id: str, user_id: str = Depends(get_user_id)):
+    result = await db.goals.delete_one({"user_id": user_id, "id": goal_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Goal not found")
     return {"message": "Goal deleted"}
 
 # User stats endpoints
-@api_router.get("/stats", response_model=UserStats)
-async def get_user_stats():
-    stats = await db.user_stats.find_one({"id": "user_stats"}, {"_id": 0})
+def stats_cache_key(user_id: str) -> str:
+    return f"stats:{user_id}"
+
+async def load_user_stats(user_id: str):
+    stats = await db.user_stats.find_one({"user_id": user_id}, USER_STATS_FIELDS.projection)
     if not stats:
-        await init_user_stats()
-        stats = await db.user_stats.find_one({"id": "user_stats"}, {"_id": 0})
-    return UserStats(**stats)
+        await seed_user(user_id)
+        stats = await db.user_stats.find_one({"user_id": user_id}, USER_STATS_FIELDS.projection)
+    return USER_STATS_FIELDS.fill([stats])[0]
+
+@api_router.get("/stats", response_model=UserStats)
+async def get_user_stats(request: Request, user_id: str = Depends(get_user_id)):
+    return await cached_response(request, stats_cache_key(user_id), lambda: load_user_stats(user_id))
 
 # Badges endpoints
+def badges_cache_key(user_id: str) -> str:
+    return f"badges:{user_id}"
+
+async def load_badges(user_id: str):
+    return BADGE_FIELDS.fill(await db.badges.find({"user_id": user_id}, BADGE_FIELDS.projection).to_list(None))
+
 @api_router.get("/badges", response_model=List[Badge])
-async def get_badges():
-    badges = await db.badges.find({}, {"_id": 0}).to_list(100)
-    return badges
+async def get_badges(request: Request, user_id: str = Depends(get_user_id)):
+    return await cached_response(request, badges_cache_key(user_id), lambda: load_badges(user_id))
 
 class BadgeCreate(BaseModel):
     name: str
@@ -278,59 +1413,295 @@ class BadgeCreate(BaseModel):
     icon: str
     condition_type: str  # streak, activity_count, level, category_specific
     condition_value: int
+    category_id: Optional[str] = None  # required for category_specific
 
 @api_router.post("/badges", response_model=Badge)
-async def create_badge(badge: BadgeCreate):
-    import uuid
+async def create_badge(badge: BadgeCreate, user_id: str = Depends(get_user_id)):
+    if badge.condition_type not in BADGE_CONDITIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown condition type: {badge.condition_type}")
+    if badge.condition_type == "category_specific" and not badge.category_id:
+        raise HTTPException(status_code=400, detail="category_specific badges need a category_id")
     badge_dict = badge.model_dump()
     badge_dict["id"] = str(uuid.uuid4())
+    badge_dict["user_id"] = user_id
     badge_dict["is_earned"] = False
     badge_dict["earned_date"] = None
     await db.badges.insert_one(badge_dict)
+    cache.invalidate(badges_cache_key(user_id))
     return Badge(**badge_dict)
 
 @api_router.delete("/badges/{badge_id}")
-async def delete_badge(badge_id: str):
-    result = await db.badges.delete_one({"id": badge_id})
+async def delete_badge(badge_id: str, user_id: str = Depends(get_user_id)):
+    result = await db.badges.delete_one({"user_id": user_id, "id": badge_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Badge not found")
+    cache.invalidate(badges_cache_key(user_id))
     return {"message": "Badge deleted"}
 
+# Live events
+# GET /events pushes small deltas of the caller's data (a new activity, the
+# stats fields that changed, a badge earned, ...) as Server-Sent Events, so
+# open pages patch their state instead of refetching it. On a replica set the
+# deltas come from a change stream and each event id is its resume token; a
+# client reconnecting with Last-Event-ID picks up where it left off. A
+# standalone mongod has no change streams, so there the stream polls the
+# user's documents and diffs snapshots instead; a client reconnecting to a
+# polling stream is sent "resync" and refetches, since missed polls cannot be
+# replayed.
+EVENT_COLLECTIONS = ("activities", "categories", "goals", "badges", "user_stats")
+EVENT_NAMES = {"activities": "activity", "categories": "category", "goals": "goal", "badges": "badge"}
+EVENT_FIELDS = {"activities": ACTIVITY_FIELDS, "categories": CATEGORY_FIELDS, "goals": GOAL_FIELDS, "badges": BADGE_FIELDS}
+STATS_EVENT_FIELDS = tuple(name for name in UserStats.model_fields if name not in ("id", "user_id"))
+GOAL_EVENT_FIELDS = ("current_progress", "window_start")
+EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL_SECONDS', '2'))
+EVENTS_KEEP_ALIVE_SECONDS = 15.0
+# A poll that finds more new activities than this (a bulk import) sends
+# "resync" rather than one event per activity
+EVENTS_MAX_POLLED_ACTIVITIES = 200
+POLL_EVENT_PREFIX = "poll:"
+
+# Delete events only carry the deleted document, and with it the user_id
+# that routes them, when the collection records pre-images (MongoDB 6.0+)
+_pre_images_enabled = False
+# Learned from the first change stream opened: None until then
+_change_streams_supported: Optional[bool] = None
+
+async def enable_change_stream_pre_images():
+    global _pre_images_enabled
+    try:
+        for collection in EVENT_COLLECTIONS:
+            await db.command("collMod", collection, changeStreamPreAndPostImages={"enabled": True})
+    except OperationFailure as exc:
+        logger.info("Change stream pre-images unavailable, deletions will not be pushed: %s", exc)
+        return
+    _pre_images_enabled = True
+
+def change_event(change: dict, category_names: dict) -> Optional[tuple]:
+    """(event, data) for a change stream document, or None if clients need not hear of it.
+
+    `category_names` names the categories of activities (see get_category_names).
+    """
+    collection, operation = change["ns"]["coll"], change["operationType"]
+    if operation == "delete":
+        deleted = change.get("fullDocumentBeforeChange")
+        if collection == "user_stats" or not deleted:
+            return None
+        return f"{EVENT_NAMES[collection]}.deleted", {"id": deleted["id"]}
+    document = change.get("fullDocument")
+    if not document:
+        # Deleted again before the post-image lookup
+        return None
+    updated = change["updateDescription"]["updatedFields"] if operation == "update" else None
+    if collection == "user_stats":
+        fields = [name for name in STATS_EVENT_FIELDS if updated is None or name in updated]
+        return ("stats.updated", {name: document.get(name) for name in fields}) if fields else None
+    if operation == "insert" and collection == "activities":
+        return "activity.created", activity_from_document(document, category_names)
+    if operation == "insert":
+        return f"{EVENT_NAMES[collection]}.created", EVENT_FIELDS[collection].shape(document)
+    if collection == "categories" and updated and updated.get("deleted"):
+        return "category.deleted", {"id": document["id"]}
+    if collection == "badges" and updated and "is_earned" in updated and document.get("is_earned"):
+        return "badge.earned", {"id": document["id"], "is_earned": True, "earned_date": document.get("earned_date")}
+    if collection == "goals" and updated and any(name in updated for name in GOAL_EVENT_FIELDS):
+        return "goal.updated", {"id": document["id"], **{name: document.get(name) for name in GOAL_EVENT_FIELDS}}
+    return None
+
+async def open_change_stream(user_id: str, resume_token: Optional[str]):
+    match = {
+        "ns.coll": {"$in": list(EVENT_COLLECTIONS)},
+        "$or": [{"fullDocument.user_id": user_id}, {"fullDocumentBeforeChange.user_id": user_id}],
+    }
+    options = {"full_document": "updateLookup", "max_await_time_ms": 1000}
+    if _pre_images_enabled:
+        options["full_document_before_change"] = "whenAvailable"
+    if resume_token:
+        options["resume_after"] = {"_data": resume_token}
+    stream = db.watch([{"$match": match}], **options)
+    # Runs the aggregate, so an unsupported deployment or a stale token fails here
+    await stream.__aenter__()
+    return stream
+
+async def change_stream_messages(user_id: str, stream):
+    idle_since = time.monotonic()
+    async with stream:
+        while True:
+            change = await stream.try_next()
+            event = None
+            if change and change["operationType"] == "insert" and change["ns"]["coll"] == "activities":
+                event = change_event(change, await get_category_names(user_id, [change["fullDocument"]]))
+            elif change:
+                event = change_event(change, {})
+            if event:
+                yield format_event(*event, event_id=change["_id"]["_data"])
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= EVENTS_KEEP_ALIVE_SECONDS:
+                yield KEEP_ALIVE
+                idle_since = time.monotonic()
+
+async def load_event_snapshot(user_id: str, previous: Optional[dict] = None) -> dict:
+    """The user's documents as last seen by a polling stream, keyed by id."""
+    stats, categories, goals, badges, activity_count = await asyncio.gather(
+        db.user_stats.find_one({"user_id": user_id}, USER_STATS_FIELDS.projection),
+        db.categories.find({"user_id": user_id, **LIVE_CATEGORY}, CATEGORY_FIELDS.projection).to_list(None),
+        db.goals.find({"user_id": user_id}, GOAL_FIELDS.projection).to_list(None),
+        db.badges.find({"user_id": user_id}, BADGE_FIELDS.projection).to_list(None),
+        db.activities.count_documents({"user_id": user_id}),
+    )
+    snapshot = {
+        "user_stats": stats or {},
+        "categories": {category["id"]: category for category in categories},
+        "goals": {goal["id"]: goal for goal in goals},
+        "badges": {badge["id"]: badge for badge in badges},
+        "activity_count": activity_count,
+    }
+    # Activities are too many to re-read every poll; their ids (covered by
+    # the user_id/id index) are only listed again when the count or the stats
+    # moved, which every create, import and delete does
+    if previous and activity_count == previous["activity_count"] and snapshot["user_stats"] == previous["user_stats"]:
+        snapshot["activity_ids"] = previous["activity_ids"]
+    else:
+        ids = await db.activities.find({"user_id": user_id}, {"_id": 0, "id": 1}).to_list(None)
+        snapshot["activity_ids"] = {activity["id"] for activity in ids}
+    return snapshot
+
+async def snapshot_events(user_id: str, previous: dict, current: dict) -> List[tuple]:
+    created_ids = current["activity_ids"] - previous["activity_ids"]
+    if len(created_ids) > EVENTS_MAX_POLLED_ACTIVITIES:
+        return [("resync", {})]
+    events = []
+    if created_ids:
+        created = await db.activities.find(
+            {"user_id": user_id, "id": {"$in": list(created_ids)}}, {"_id": 0}
+        ).sort(ACTIVITY_SORT).to_list(None)
+        events += [("activity.created", activity) for activity in await activities_from_documents(user_id, created)]
+    events += [("activity.deleted", {"id": key}) for key in previous["activity_ids"] - current["activity_ids"]]
+    stats = changed_fields(previous["user_stats"], current["user_stats"], STATS_EVENT_FIELDS)
+    if stats:
+        events.append(("stats.updated", stats))
+    for collection in ("categories", "goals", "badges"):
+        name = EVENT_NAMES[collection]
+        created, deleted, changed = diff_documents(previous[collection], current[collection])
+        events += [(f"{name}.created", EVENT_FIELDS[collection].fill([document])[0]) for document in created]
+        events += [(f"{name}.deleted", {"id": key}) for key in deleted]
+        for old, new in changed:
+            if collection == "badges" and new.get("is_earned") and not old.get("is_earned"):
+                events.append(("badge.earned", {"id": new["id"], "is_earned": True, "earned_date": new.get("earned_date")}))
+            elif collection == "goals" and changed_fields(old, new, GOAL_EVENT_FIELDS):
+                events.append(("goal.updated", {"id": new["id"], **{field: new.get(field) for field in GOAL_EVENT_FIELDS}}))
+    return events
+
+async def polling_messages(user_id: str, snapshot: dict):
+    sequence = 0
+    idle_since = time.monotonic()
+    while True:
+        await asyncio.sleep(EVENTS_POLL_INTERVAL)
+        current = await load_event_snapshot(user_id, snapshot)
+        for event, data in await snapshot_events(user_id, snapshot, current):
+            sequence += 1
+            yield format_event(event, data, event_id=f"{POLL_EVENT_PREFIX}{sequence}")
+            idle_since = time.monotonic()
+        snapshot = current
+        if time.monotonic() - idle_since >= EVENTS_KEEP_ALIVE_SECONDS:
+            yield KEEP_ALIVE
+            idle_since = time.monotonic()
+
+async def live_events(user_id: str, last_event_id: Optional[str]):
+    global _change_streams_supported
+    resume_token = last_event_id if last_event_id and not last_event_id.startswith(POLL_EVENT_PREFIX) else None
+    # Anything but a resumable token means events may have been missed
+    resync = bool(last_event_id) and not resume_token
+    if _change_streams_supported is not False:
+        stream = None
+        try:
+            stream = await open_change_stream(user_id, resume_token)
+        except OperationFailure as exc:
+            if exc.code in CHANGE_STREAMS_UNSUPPORTED:
+                logger.info("Change streams unavailable, /api/events falls back to polling: %s", exc)
+                _change_streams_supported = False
+            elif resume_token:
+                # Unknown or expired token (the oplog moved past it): start from now
+                stream = await open_change_stream(user_id, None)
+                resync = True
+            else:
+                raise
+        if stream is not None:
+            _change_streams_supported = True
+            yield format_event("ready", {"mode": "change_stream"})
+            if resync:
+                yield format_event("resync", {})
+            async for message in change_stream_messages(user_id, stream):
+                yield message
+            return
+    # Changes are diffed against this first snapshot, so take it before "ready"
+    snapshot = await load_event_snapshot(user_id)
+    yield format_event("ready", {"mode": "polling"})
+    if last_event_id:
+        yield format_event("resync", {})
+    async for message in polling_messages(user_id, snapshot):
+        yield message
+
+@api_router.get("/events")
+async def stream_events(last_event_id: Optional[str] = Header(None), user_id: str = Depends(get_user_id)):
+    return StreamingResponse(
+        live_events(user_id, last_event_id),
+        media_type="text/event-stream",
+        # No proxy buffering: each event should reach the client as it happens
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Cache endpoints
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Cache hits, misses and cached entries by key kind, across all users."""
+    return cache.stats()
+
+# Metrics endpoint
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of request, MongoDB command and cache metrics."""
+    # Cache keys are per user; the cache counts them by kind ("stats", "heatmap", ...)
+    stats = cache.stats()
+    hits = {(kind,): counts["hits"] for kind, counts in stats.items()}
+    misses = {(kind,): counts["misses"] for kind, counts in stats.items()}
+    lines = metrics.render()
+    lines += render_counter("levelup_cache_hits_total", "Read-through cache hits by key kind.", ("key",), hits)
+    lines += render_counter("levelup_cache_misses_total", "Read-through cache misses by key kind.", ("key",), misses)
+    return "\n".join(lines) + "\n"
+
 # Analytics endpoints
 @api_router.get("/analytics/summary")
-async def get_analytics_summary():
+async def get_analytics_summary(user_id: str = Depends(get_user_id)):
     # Get activities for the last 30 days
     end_date = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=30)
     
-    activities = await db.activities.find({
-        "date": {"$gte": start_date.date().isoformat()}
-    }, {"_id": 0}).to_list(1000)
+    # Sum the daily rollups per category
+    groups = await analytics_db.daily_rollups.aggregate([
+        {"$match": {"user_id": user_id, "date": {"$gte": start_date.date().isoformat()}}},
+        {"$group": {"_id": "$category_name", "duration": {"$sum": "$duration"}, "count": {"$sum": "$count"}}},
+    ]).to_list(None)
     
-    # Calculate summary by category
-    category_totals = defaultdict(int)
-    for activity in activities:
-        category_totals[activity["category_name"]] += activity["duration"]
+    category_totals = {group["_id"]: group["duration"] for group in groups}
+    total_activities = sum(group["count"] for group in groups)
     
-    return {"category_totals": dict(category_totals), "total_activities": len(activities)}
+    return {"category_totals": category_totals, "total_activities": total_activities}
 
 @api_router.get("/analytics/daily")
-async def get_daily_analytics(days: int = 7):
+async def get_daily_analytics(days: int = 7, user_id: str = Depends(get_user_id)):
     end_date = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=days)
     
-    activities = await db.activities.find({
-        "date": {"$gte": start_date.date().isoformat()}
-    }, {"_id": 0}).to_list(1000)
+    rollups = await analytics_db.daily_rollups.find(
+        {"user_id": user_id, "date": {"$gte": start_date.date().isoformat()}},
+        {"_id": 0, "date": 1, "category_name": 1, "duration": 1}
+    ).to_list(None)
     
-    # Group by date
     daily_data = defaultdict(lambda: defaultdict(int))
-    for activity in activities:
-        date = activity["date"]
-        category = activity["category_name"]
-        daily_data[date][category] += activity["duration"]
+    for rollup in rollups:
+        daily_data[rollup["date"]][rollup["category_name"]] += rollup["duration"]
     
-    # Format for recharts
+    # Format for recharts, filling in empty days
     result = []
     for i in range(days):
         date = (start_date + timedelta(days=i)).date().isoformat()
@@ -342,21 +1713,18 @@ async def get_daily_analytics(days: int = 7):
     return result
 
 @api_router.get("/analytics/category/{category_id}")
-async def get_category_analytics(category_id: str, days: int = 30):
+async def get_category_analytics(category_id: str, days: int = 30, user_id: str = Depends(get_user_id)):
     end_date = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=days)
     
-    activities = await db.activities.find({
-        "category_id": category_id,
-        "date": {"$gte": start_date.date().isoformat()}
-    }, {"_id": 0}).to_list(1000)
+    rollups = await analytics_db.daily_rollups.find(
+        {"user_id": user_id, "category_id": category_id, "date": {"$gte": start_date.date().isoformat()}},
+        {"_id": 0, "date": 1, "duration": 1}
+    ).to_list(None)
     
-    # Group by date
-    daily_totals = defaultdict(int)
-    for activity in activities:
-        daily_totals[activity["date"]] += activity["duration"]
+    daily_totals = {rollup["date"]: rollup["duration"] for rollup in rollups}
     
-    # Format for recharts
+    # Format for recharts, filling in empty days
     result = []
     for i in range(days):
         date = (start_date + timedelta(days=i)).date().isoformat()
@@ -367,108 +1735,673 @@ async def get_category_analytics(category_id: str, days: int = 30):
     
     return result
 
-# Helper functions
-async def update_user_stats_on_activity(activity_date: str, duration: int):
-    stats = await db.user_stats.find_one({"id": "user_stats"}, {"_id": 0})
-    if not stats:
-        return
+# Trends
+# Computed from a dense days x categories matrix of the user's rollups, so
+# every figure is a whole-matrix NumPy operation (see trends.py) and a
+# multi-year window over all categories costs about as much as a month.
+TRENDS_MAX_DAYS = 3660
+
+def _round_series(values: np.ndarray) -> list:
+    return np.round(values, 1).tolist()
+
+@api_router.get("/analytics/trends")
+async def get_trends(
+    days: int = Query(90, ge=1, le=TRENDS_MAX_DAYS),
+    window: int = Query(7, ge=1, le=365),
+    user_id: str = Depends(get_user_id),
+):
+    """Rolling means, week-over-week deltas and consistency per category for the last `days` days."""
+    today = datetime.now(timezone.utc).date()
+    lookback = lookback_days(window)
+    first_day = today - timedelta(days=days - 1 + lookback)
+    rollups, categories = await asyncio.gather(
+        analytics_db.daily_rollups.find(
+            {"user_id": user_id, "date": {"$gte": first_day.isoformat(), "$lte": today.isoformat()}},
+            {"_id": 0, "date": 1, "category_id": 1, "category_name": 1, "duration": 1}
+        ).to_list(None),
+        analytics_db.categories.find({"user_id": user_id, **LIVE_CATEGORY}, {"_id": 0, "id": 1, "name": 1}).to_list(None),
+    )
     
-    # Add XP (10 XP per minute)
-    xp_gained = duration * 10
-    new_xp = stats["xp"] + xp_gained
-    new_level = stats["level"]
-    
-    # Level up logic (100 XP per level)
-    xp_per_level = 100
-    while new_xp >= xp_per_level * new_level:
-        new_xp -= xp_per_level * new_level
-        new_level += 1
-    
-    # Update streak
-    current_streak = stats["current_streak"]
-    longest_streak = stats["longest_streak"]
-    last_activity_date = stats.get("last_activity_date")
-    
-    if last_activity_date:
-        last_date = datetime.fromisoformat(last_activity_date).date()
-        current_date = datetime.fromisoformat(activity_date).date()
-        days_diff = (current_date - last_date).days
-        
-        if days_diff == 1:
-            current_streak += 1
-        elif days_diff > 1:
-            current_streak = 1
-    else:
-        current_streak = 1
+    # One column per category, including deleted ones that still have minutes
+    names = {category["id"]: category["name"] for category in categories}
+    for rollup in rollups:
+        names.setdefault(rollup["category_id"], rollup["category_name"])
+    columns = {category_id: index for index, category_id in enumerate(names)}
+    day_index = (
+        np.array([rollup["date"] for rollup in rollups], dtype="datetime64[D]") - np.datetime64(first_day, "D")
+    ).astype(np.intp)
+    column_index = np.fromiter((columns[rollup["category_id"]] for rollup in rollups), dtype=np.intp, count=len(rollups))
+    minutes = np.fromiter((rollup["duration"] for rollup in rollups), dtype=float, count=len(rollups))
+    matrix = daily_matrix(day_index, column_index, minutes, (days + lookback, len(columns)))
+    trends = compute_trends(matrix, window, lookback)
+    
+    previous_week = trends["previous_week"]
+    change = np.divide(
+        trends["this_week"] - previous_week, previous_week,
+        out=np.full_like(previous_week, np.nan), where=previous_week > 0,
+    ) * 100
+    summaries = zip(
+        names.items(), *(_round_series(trends[name]) for name in ("total", "mean", "std", "consistency", "this_week", "previous_week")),
+        np.round(trends["active_ratio"] * days).astype(int).tolist(), np.round(change, 1).tolist(),
+    )
+    return {
+        "start_date": (first_day + timedelta(days=lookback)).isoformat(),
+        "end_date": today.isoformat(),
+        "days": days,
+        "window": window,
+        "categories": [
+            {
+                "id": category_id,
+                "name": name,
+                "total": total,
+                "mean": mean,
+                "std": std,
+                "active_days": active_days,
+                "consistency": consistency,
+                "week_over_week": {
+                    "this_week": this_week,
+                    "previous_week": previous,
+                    # None when there is nothing to compare against
+                    "percent": None if math.isnan(percent) else percent,
+                },
+            }
+            for (category_id, name), total, mean, std, consistency, this_week, previous, active_days, percent in summaries
+        ],
+        # Per-day series, one list per category id, oldest day first
+        "series": {
+            name: dict(zip(names, _round_series(trends[name].T)))
+            for name in ("minutes", "rolling_mean", "week_over_week")
+        },
+    }
+
+# Hour-of-day distribution
+# Activities are split into the hours their minutes fall in inside the
+# database: each activity overlapping the window is clipped to it, unwound
+# into the absolute hours it spans and credited with the minutes it spends
+# in each, then everything is summed per (weekday, hour). The match is on the
+# activities' (user_id[, category_id], start_minute) indexes, so the cost
+# follows the window rather than the length of the user's history.
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+# 1970-01-01, day 0 of the activity minutes, was a Thursday
+EPOCH_WEEKDAY = 3
+
+def hourly_pipeline(match: dict, window_start: int, window_end: int) -> list:
+    return [
+        {"$match": match},
+        {"$project": {
+            "_id": 0,
+            "start": {"$max": ["$start_minute", window_start]},
+            "end": {"$min": ["$end_minute", window_end]},
+        }},
+        {"$match": {"$expr": {"$gt": ["$end", "$start"]}}},
+        {"$project": {"start": 1, "end": 1, "hour": {"$range": [
+            {"$toInt": {"$floor": {"$divide": ["$start", 60]}}},
+            {"$toInt": {"$ceil": {"$divide": ["$end", 60]}}},
+        ]}}},
+        {"$unwind": "$hour"},
+        {"$group": {
+            "_id": {
+                "weekday": {"$mod": [{"$add": [{"$floor": {"$divide": ["$hour", 24]}}, EPOCH_WEEKDAY]}, 7]},
+                "hour": {"$mod": ["$hour", 24]},
+            },
+            "minutes": {"$sum": {"$subtract": [
+                {"$min": ["$end", {"$multiply": [{"$add": ["$hour", 1]}, 60]}]},
+                {"$max": ["$start", {"$multiply": ["$hour", 60]}]},
+            ]}},
+        }},
+    ]
+
+@api_router.get("/analytics/hourly")
+async def get_hourly_distribution(
+    category_id: Optional[str] = None,
+    days: int = Query(90, ge=1, le=TRENDS_MAX_DAYS),
+    user_id: str = Depends(get_user_id),
+):
+    """Minutes per weekday (rows, Monday first) and hour of day (columns) over the last `days` days."""
+    today = datetime.now(timezone.utc).date()
+    first_day = today - timedelta(days=days - 1)
+    window_start = (first_day - EPOCH.date()).days * MINUTES_PER_DAY
+    window_end = window_start + days * MINUTES_PER_DAY
+    # Activities from the day before the window can run into it
+    match = {"user_id": user_id, "start_minute": {"$gte": window_start - MINUTES_PER_DAY, "$lt": window_end}}
+    if category_id:
+        match["category_id"] = category_id
+    buckets = await analytics_db.activities.aggregate(hourly_pipeline(match, window_start, window_end)).to_list(None)
     
-    longest_streak = max(longest_streak, current_streak)
+    minutes = [[0] * 24 for _ in WEEKDAYS]
+    for bucket in buckets:
+        minutes[int(bucket["_id"]["weekday"])][int(bucket["_id"]["hour"])] = int(bucket["minutes"])
+    return {
+        "category_id": category_id,
+        "start_date": first_day.isoformat(),
+        "end_date": today.isoformat(),
+        "days": days,
+        "weekdays": list(WEEKDAYS),
+        "minutes": minutes,
+        "total": sum(map(sum, minutes)),
+    }
+
+# Heatmap
+# Read from the primary, unlike the other analytics: the result is cached until
+# a write invalidates it, and a lagging secondary would re-cache the old value.
+async def load_heatmap(user_id: str, year: int) -> dict:
+    """Per-day activity counts and minutes for one calendar year, in columnar form.
+
+    Only days with activity are listed; `offsets` are days since January 1st.
+    """
+    groups = await db.daily_rollups.aggregate([
+        {"$match": {"user_id": user_id, "date": {"$gte": f"{year:04d}-01-01", "$lte": f"{year:04d}-12-31"}}},
+        {"$group": {"_id": "$date", "count": {"$sum": "$count"}, "minutes": {"$sum": "$duration"}}},
+        {"$sort": {"_id": 1}},
+    ]).to_list(None)
+    january_first = datetime(year, 1, 1)
+    return {
+        "start": january_first.date().isoformat(),
+        "offsets": [(datetime.strptime(group["_id"], "%Y-%m-%d") - january_first).days for group in groups],
+        "counts": [group["count"] for group in groups],
+        "minutes": [group["minutes"] for group in groups],
+    }
+
+async def get_heatmap_window(user_id: str, start: datetime, end: datetime) -> dict:
+    """Columnar heatmap for [start, end], stitched from the cached per-year heatmaps."""
+    years = range(start.year, end.year + 1)
+    heatmaps = await asyncio.gather(*(
+        cache.get(heatmap_cache_key(user_id, year), lambda year=year: load_heatmap(user_id, year)) for year in years
+    ))
+    window = {"start": start.date().isoformat(), "offsets": [], "counts": [], "minutes": []}
+    for year, entry in zip(years, heatmaps):
+        shift = (datetime(year, 1, 1) - start).days
+        for offset, count, minutes in zip(entry.value["offsets"], entry.value["counts"], entry.value["minutes"]):
+            if 0 <= offset + shift <= (end - start).days:
+                window["offsets"].append(offset + shift)
+                window["counts"].append(count)
+                window["minutes"].append(minutes)
+    return window
+
+@api_router.get("/analytics/heatmap")
+async def get_heatmap(
+    request: Request,
+    year: Optional[int] = Query(None, ge=1970, le=9999),
+    user_id: str = Depends(get_user_id),
+):
+    if year is None:
+        year = datetime.now(timezone.utc).year
+    return await cached_response(request, heatmap_cache_key(user_id, year), lambda: load_heatmap(user_id, year))
+
+# Timeline endpoints
+TIMELINE_MAX_DAYS = 31
+
+async def load_timeline(user_id: str, start: datetime, end: datetime) -> dict:
+    """Activities overlapping the days [start, end], sorted by start minute.
+
+    Offsets are minutes from `start` 00:00, so an activity spilling over from
+    the previous day has a negative start_offset.
+    """
+    window_start = (start - EPOCH).days * MINUTES_PER_DAY
+    window_end = ((end - EPOCH).days + 1) * MINUTES_PER_DAY
+    documents, categories = await asyncio.gather(
+        db.activities.find(
+            # Anything overlapping the window started at most a day before it
+            {"user_id": user_id, "start_minute": {"$gte": window_start - MINUTES_PER_DAY, "$lt": window_end}, "end_minute": {"$gt": window_start}},
+            {"_id": 0}
+        ).sort("start_minute", ASCENDING).to_list(None),
+        cache.get(categories_cache_key(user_id), lambda: load_categories(user_id)),
+    )
+    categories_by_id = {category["id"]: category for category in categories.value}
     
-    await db.user_stats.update_one(
-        {"id": "user_stats"},
+    entries = []
+    for document, activity in zip(documents, await activities_from_documents(user_id, documents)):
+        category = categories_by_id.get(activity["category_id"], {})
+        start_minute, end_minute = document["start_minute"], document["end_minute"]
+        entries.append({
+            **activity,
+            "end_time": _minutes_to_time(end_minute % MINUTES_PER_DAY),
+            "start_offset": start_minute - window_start,
+            "end_offset": end_minute - window_start,
+            "color": category.get("color"),
+            "icon": category.get("icon"),
+        })
+    return {"from": start.date().isoformat(), "to": end.date().isoformat(), "activities": entries}
+
+@api_router.get("/timeline")
+async def get_timeline_range(
+    from_date: str = Query(..., alias="from"),
+    to_date: str = Query(..., alias="to"),
+    user_id: str = Depends(get_user_id),
+):
+    start, end = _parse_date(from_date), _parse_date(to_date)
+    if end < start:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (end - start).days >= TIMELINE_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Timeline range is limited to {TIMELINE_MAX_DAYS} days")
+    return await load_timeline(user_id, start, end)
+
+@api_router.get("/timeline/{date}")
+async def get_timeline(date: str, user_id: str = Depends(get_user_id)):
+    day = _parse_date(date)
+    return await load_timeline(user_id, day, day)
+
+# Dashboard endpoint
+async def load_recent_activities(user_id: str, limit: int):
+    return await activities_from_documents(user_id, await db.activities.find(
+        {"user_id": user_id}, {"_id": 0}
+    ).sort(ACTIVITY_SORT).limit(limit).to_list(limit))
+
+@api_router.get("/dashboard")
+async def get_dashboard(recent: int = Query(5, ge=1, le=50), user_id: str = Depends(get_user_id)):
+    """Everything the Dashboard page renders, fetched concurrently in one response."""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    stats, activities, categories, daily, heatmap = await asyncio.gather(
+        cache.get(stats_cache_key(user_id), lambda: load_user_stats(user_id)),
+        load_recent_activities(user_id, recent),
+        cache.get(categories_cache_key(user_id), lambda: load_categories(user_id)),
+        get_daily_analytics(days=7, user_id=user_id),
+        get_heatmap_window(user_id, today - timedelta(days=365), today),
+    )
+    return {
+        "stats": stats.value,
+        "recent_activities": activities,
+        "categories": categories.value,
+        "daily": daily,
+        "heatmap": heatmap,
+    }
+
+# Export endpoints
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '5000'))
+EXPORT_FIELDS = ["id", "category_id", "category_name", "date", "start_time", "duration", "notes", "created_at"]
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+async def _export_batches(user_id: str, cursor):
+    async for batch in activity_batches(user_id, cursor, EXPORT_BATCH_SIZE):
+        yield [{field: activity.get(field) for field in EXPORT_FIELDS} for activity in batch]
+
+async def _export_csv(batches):
+    header = io.StringIO()
+    csv.writer(header).writerow(EXPORT_FIELDS)
+    yield header.getvalue()
+    async for batch in batches:
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, EXPORT_FIELDS, extrasaction="ignore").writerows(batch)
+        yield buffer.getvalue()
+
+class _ParquetSink(io.RawIOBase):
+    """Write-only stream that hands out what has been written so far.
+
+    tell() keeps counting across drains so the row-group offsets that
+    pyarrow records in the footer stay correct.
+    """
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+async def _export_parquet(batches):
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = pa.schema([(field, pa.int64() if field == "duration" else pa.string()) for field in EXPORT_FIELDS])
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, schema)
+    
+    def write_row_group(batch):
+        frame = pd.DataFrame(batch, columns=EXPORT_FIELDS)
+        writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+        return sink.drain()
+    
+    try:
+        async for batch in batches:
+            # Encoding is CPU-bound; keep it off the event loop
+            yield await asyncio.to_thread(write_row_group, batch)
+    finally:
+        writer.close()
+    yield sink.drain()
+
+@api_router.get("/export/activities")
+async def export_activities(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    category_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    user_id: str = Depends(get_user_id),
+):
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    
+    query = {"user_id": user_id}
+    if category_id:
+        query["category_id"] = category_id
+    if start_date or end_date:
+        query["start_minute"] = start_minute_range(start_date, end_date)
+    
+    cursor = db.activities.find(query, {"_id": 0}).sort([("start_minute", ASCENDING), ("id", ASCENDING)]).batch_size(EXPORT_BATCH_SIZE)
+    batches = _export_batches(user_id, cursor)
+    
+    if format == "parquet":
+        body = _export_parquet(batches)
+    elif format == "csv":
+        body = _export_csv(batches)
+    else:
+        body = stream_ndjson(batches)
+    
+    filename = f"levelup-activities-{datetime.now(timezone.utc).date().isoformat()}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# Helper functions
+XP_PER_MINUTE = 10
+XP_PER_LEVEL = 100  # reaching level L + 1 from level L costs XP_PER_LEVEL * L
+
+def level_for_total_xp(total_xp: int) -> int:
+    # Largest L with XP_PER_LEVEL * L * (L - 1) / 2 <= total_xp
+    return (XP_PER_LEVEL + math.isqrt(XP_PER_LEVEL * (XP_PER_LEVEL + 8 * total_xp))) // (2 * XP_PER_LEVEL)
+
+def _xp_to_reach_level(level):
+    # Aggregation expression for the total XP needed to reach `level`
+    return {"$divide": [{"$multiply": [XP_PER_LEVEL, level, {"$subtract": [level, 1]}]}, 2]}
+
+def _add_xp_stages(xp_gained: int, activity_count: int):
+    # Pipeline stages adding XP and activities to user_stats, levelling up in closed form
+    return [
+        {"$set": {"_total_xp": {"$add": [_xp_to_reach_level("$level"), "$xp", xp_gained]}}},
         {"$set": {
-            "xp": new_xp,
-            "level": new_level,
-            "total_activities": stats["total_activities"] + 1,
-            "current_streak": current_streak,
-            "longest_streak": longest_streak,
-            "last_activity_date": activity_date
-        }}
+            # Closed form of level_for_total_xp
+            "level": {"$toInt": {"$floor": {"$divide": [
+                {"$add": [XP_PER_LEVEL, {"$sqrt": {"$multiply": [XP_PER_LEVEL, {"$add": [XP_PER_LEVEL, {"$multiply": [8, "$_total_xp"]}]}]}}]},
+                2 * XP_PER_LEVEL,
+            ]}}},
+            "total_activities": {"$add": ["$total_activities", activity_count]},
+        }},
+        {"$set": {"xp": {"$toInt": {"$subtract": ["$_total_xp", _xp_to_reach_level("$level")]}}}},
+        {"$unset": "_total_xp"},
+    ]
+
+async def compute_streaks(user_id: str):
+    """Return (current_streak, longest_streak, last_activity_date) from the user's days with activity."""
+    dates = sorted(datetime.strptime(date, "%Y-%m-%d").date() for date in await db.daily_rollups.distinct("date", {"user_id": user_id}))
+    if not dates:
+        return 0, 0, None
+    current = longest = 1
+    for previous, date in zip(dates, dates[1:]):
+        current = current + 1 if (date - previous).days == 1 else 1
+        longest = max(longest, current)
+    return current, longest, dates[-1].isoformat()
+
+STREAK_WINDOW_DAYS = 32
+
+def _streak_run(day, days: set):
+    """First and last day of the run of consecutive days in `days` through `day`, or None."""
+    if day not in days:
+        return None
+    first = last = day
+    while first - timedelta(days=1) in days:
+        first -= timedelta(days=1)
+    while last + timedelta(days=1) in days:
+        last += timedelta(days=1)
+    return first, last
+
+async def compute_streaks_around(user_id: str, dates: List[str]):
+    """Return what compute_streaks would once `dates` have activity, reading only the days near them.
+
+    The longest streak is the longest run through one of `dates` or the latest
+    day; callers keep the larger of it and the stored one. Each window starts
+    STREAK_WINDOW_DAYS either side of those days and widens while a run
+    reaches its edge, so a batch reads its runs rather than the whole history.
+    """
+    latest = await db.daily_rollups.find_one({"user_id": user_id}, {"_id": 0, "date": 1}, sort=[("date", DESCENDING)])
+    if not latest:
+        return 0, 0, None
+    last = datetime.strptime(latest["date"], "%Y-%m-%d").date()
+    focus = sorted({datetime.strptime(date, "%Y-%m-%d").date() for date in dates if date <= latest["date"]} | {last})
+    window = timedelta(days=STREAK_WINDOW_DAYS)
+    while True:
+        bounds = []
+        for day in focus:
+            if bounds and day - window <= bounds[-1][1]:
+                bounds[-1][1] = min(day + window, last)
+            else:
+                bounds.append([day - window, min(day + window, last)])
+        found = await db.daily_rollups.distinct("date", {
+            "user_id": user_id,
+            "$or": [{"date": {"$gte": first.isoformat(), "$lte": final.isoformat()}} for first, final in bounds],
+        })
+        days = {datetime.strptime(date, "%Y-%m-%d").date() for date in found}
+        runs = [run for run in (_streak_run(day, days) for day in focus) if run]
+        # Days past the latest one have no activity, so only a run reaching
+        # the edge of a window short of it may go on
+        if all(first > bounds_first and (final == last or final < bounds_final)
+               for first, final in runs
+               for bounds_first, bounds_final in bounds if bounds_first <= first <= bounds_final):
+            break
+        window *= 4
+    current = (last - _streak_run(last, days)[0]).days + 1
+    longest = max((final - first).days + 1 for first, final in runs)
+    return current, longest, last.isoformat()
+
+async def update_user_stats_on_activities(user_id: str, activity_count: int, minutes: int, dates: Optional[List[str]] = None):
+    """Apply created or imported activities to the user's stats in one update and return the updated stats.
+
+    XP, level and counters are added inside the update pipeline, so concurrent
+    writers cannot lose each other's increments. Streaks come from the rollups
+    around `dates`, or the whole history when the dates are not known.
+    """
+    if dates is None:
+        current_streak, longest_streak, last_activity_date = await compute_streaks(user_id)
+    else:
+        current_streak, longest_streak, last_activity_date = await compute_streaks_around(user_id, dates)
+    stats = await db.user_stats.find_one_and_update(
+        {"user_id": user_id},
+        _add_xp_stages(minutes * XP_PER_MINUTE, activity_count) + [
+            {"$set": {
+                "current_streak": current_streak,
+                "longest_streak": {"$max": ["$longest_streak", longest_streak]},
+                "last_activity_date": last_activity_date,
+            }},
+        ],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
     )
+    cache.invalidate(stats_cache_key(user_id))
+    return stats
+
+# Badge rules
+# Built-in badges are seeded without conditions; custom badges carry their own
+# condition_type/condition_value (and category_id for category_specific).
+BUILTIN_BADGE_CONDITIONS = {
+    "first_step": ("activity_count", 1),
+    "week_warrior": ("streak", 7),
+    "centurion": ("activity_count", 100),
+    "level_5": ("level", 5),
+    "level_10": ("level", 10),
+    "month_master": ("streak", 30),
+}
+
+BADGE_CONDITIONS = {
+    "streak": lambda stats, value, counts, badge: stats["current_streak"] >= value,
+    "activity_count": lambda stats, value, counts, badge: stats["total_activities"] >= value,
+    "level": lambda stats, value, counts, badge: stats["level"] >= value,
+    "category_specific": lambda stats, value, counts, badge: counts.get(badge.get("category_id"), 0) >= value,
+}
+
+async def get_badge_definitions(user_id: str) -> List[dict]:
+    return (await cache.get(badges_cache_key(user_id), lambda: load_badges(user_id))).value
 
-async def check_badges():
-    stats = await db.user_stats.find_one({"id": "user_stats"}, {"_id": 0})
+def badge_condition(badge: dict):
+    if badge["id"] in BUILTIN_BADGE_CONDITIONS:
+        return BUILTIN_BADGE_CONDITIONS[badge["id"]]
+    if badge.get("condition_type") in BADGE_CONDITIONS:
+        return badge["condition_type"], badge.get("condition_value", 0)
+    return None
+
+async def category_activity_counts(user_id: str, category_ids) -> dict:
+    groups = await db.daily_rollups.aggregate([
+        {"$match": {"user_id": user_id, "category_id": {"$in": list(category_ids)}}},
+        {"$group": {"_id": "$category_id", "count": {"$sum": "$count"}}},
+    ]).to_list(None)
+    return {group["_id"]: group["count"] for group in groups}
+
+async def check_badges(user_id: str, stats: Optional[dict] = None) -> List[str]:
+    """Award every badge whose condition `stats` now meets; returns the newly earned ids.
+
+    Badge definitions come from the read-through cache and all awards go out
+    in one bulk_write, so a typical activity costs no badge round trips at all.
+    """
+    if stats is None:
+        stats = await db.user_stats.find_one({"user_id": user_id}, {"_id": 0})
     if not stats:
-        return
+        return []
     
-    # Check First Step badge
-    if stats["total_activities"] >= 1:
-        await db.badges.update_one(
-            {"id": "first_step"},
-            {"$set": {"is_earned": True, "earned_date": datetime.now(timezone.utc).isoformat()}}
-        )
+    pending = [(badge, badge_condition(badge)) for badge in await get_badge_definitions(user_id) if not badge.get("is_earned")]
+    pending = [(badge, condition) for badge, condition in pending if condition]
     
-    # Check Week Warrior badge
-    if stats["current_streak"] >= 7:
-        await db.badges.update_one(
-            {"id": "week_warrior"},
-            {"$set": {"is_earned": True, "earned_date": datetime.now(timezone.utc).isoformat()}}
-        )
+    category_ids = {badge.get("category_id") for badge, (condition_type, _) in pending if condition_type == "category_specific"}
+    counts = await category_activity_counts(user_id, category_ids) if category_ids else {}
     
-    # Check Centurion badge
-    if stats["total_activities"] >= 100:
-        await db.badges.update_one(
-            {"id": "centurion"},
-            {"$set": {"is_earned": True, "earned_date": datetime.now(timezone.utc).isoformat()}}
-        )
+    earned = [
+        badge for badge, (condition_type, value) in pending
+        if BADGE_CONDITIONS[condition_type](stats, value, counts, badge)
+    ]
+    if not earned:
+        return []
     
-    # Check level badges
-    if stats["level"] >= 5:
-        await db.badges.update_one(
-            {"id": "level_5"},
-            {"$set": {"is_earned": True, "earned_date": datetime.now(timezone.utc).isoformat()}}
-        )
+    earned_date = datetime.now(timezone.utc).isoformat()
+    await db.badges.bulk_write([
+        # is_earned guard keeps earned_date stable if another worker got there first
+        UpdateOne({"user_id": user_id, "id": badge["id"], "is_earned": {"$ne": True}}, {"$set": {"is_earned": True, "earned_date": earned_date}})
+        for badge in earned
+    ], ordered=False)
+    cache.invalidate(badges_cache_key(user_id))
+    return [badge["id"] for badge in earned]
+
+# Activity side effects
+# Creating or deleting an activity changes its day's rollup and the progress
+# of goals covering that day; creating one also adds XP, moves the streak and
+# may earn badges. None of that is in the write's response, so the handlers
+# only queue it, and a background worker applies each user's queued effects
+# as one batch: a burst of writes by one user costs one rollup bulk_write,
+# one goal bulk_write, one stats update and one badge check. Reads see the
+# effects a moment after the write; activity_effects.join() waits for them.
+#
+# With ACTIVITY_OUTBOX enabled each queued effect is also recorded in
+# activity_outbox until applied, and startup requeues what a crashed process
+# left there. Delivery is at-least-once: a crash between applying a batch and
+# clearing its entries applies that batch again. Each entry is claimed by the
+# process that queued it; a claim older than ACTIVITY_OUTBOX_REPLAY_AFTER_SECONDS
+# is treated as abandoned, and a replaying process takes it over atomically,
+# so several processes share the outbox without replaying an entry twice.
+ACTIVITY_OUTBOX = os.environ.get('ACTIVITY_OUTBOX', '').lower() in ('1', 'true', 'yes')
+ACTIVITY_OUTBOX_REPLAY_AFTER_SECONDS = float(os.environ.get('ACTIVITY_OUTBOX_REPLAY_AFTER_SECONDS', '300'))
+ACTIVITY_EFFECT_FIELDS = ("user_id", "date", "category_id", "category_name", "duration")
+
+def activity_effect(activity: dict, sign: int) -> dict:
+    return {"activity": {name: activity[name] for name in ACTIVITY_EFFECT_FIELDS}, "sign": sign}
+
+async def apply_activity_effects(user_id: str, effects: List[dict]):
+    """Apply one batch of a user's queued effects: activity writes, finished imports and goal refreshes."""
+    # Refreshes read the rollups before this batch's changes, which then $inc
+    # the refreshed window like any other
+    for effect in effects:
+        if "refresh_goals" in effect:
+            try:
+                await refresh_goal_progress(user_id, effect["refresh_goals"], effect["today"])
+            except Exception as e:
+                if not effect["done"].done():
+                    effect["done"].set_exception(e)
+            else:
+                if not effect["done"].done():
+                    effect["done"].set_result(None)
     
-    if stats["level"] >= 10:
-        await db.badges.update_one(
-            {"id": "level_10"},
-            {"$set": {"is_earned": True, "earned_date": datetime.now(timezone.utc).isoformat()}}
-        )
+    changes = [(effect["activity"], effect["sign"]) for effect in effects if "activity" in effect]
+    await apply_rollup_changes(changes)
+    await apply_goal_changes(changes)
     
-    # Check Month Master badge
-    if stats["current_streak"] >= 30:
-        await db.badges.update_one(
-            {"id": "month_master"},
-            {"$set": {"is_earned": True, "earned_date": datetime.now(timezone.utc).isoformat()}}
+    created = [activity for activity, sign in changes if sign > 0]
+    imports = [effect for effect in effects if "imported" in effect]
+    stats = None
+    if created or imports:
+        # One create and a coalesced batch take the same path, so streaks only
+        # depend on the days with activity, not on how the writes were batched
+        count = len(created) + sum(effect["imported"] for effect in imports)
+        minutes = sum(activity["duration"] for activity in created) + sum(effect["minutes"] for effect in imports)
+        dates = [activity["date"] for activity in created] + [date for effect in imports for date in effect.get("dates", ())]
+        # Imports queued before they carried their dates need the whole history
+        if any("dates" not in effect for effect in imports):
+            dates = None
+        stats = await update_user_stats_on_activities(user_id, count, minutes, dates)
+    if stats:
+        await check_badges(user_id, stats)
+    
+    outbox_ids = [effect["outbox_id"] for effect in effects if "outbox_id" in effect]
+    if outbox_ids:
+        await db.activity_outbox.delete_many({"_id": {"$in": outbox_ids}})
+
+activity_effects = CoalescingQueue(apply_activity_effects, workers=int(os.environ.get('ACTIVITY_EFFECT_WORKERS', '4')))
+
+async def queue_activity_effects(user_id: str, effect: dict):
+    if ACTIVITY_OUTBOX:
+        now = datetime.now(timezone.utc).isoformat()
+        entry = {"user_id": user_id, "effect": effect, "created_at": now, "claimed_by": INSTANCE_ID, "claimed_at": now}
+        await db.activity_outbox.insert_one(entry)
+        effect = {**effect, "outbox_id": entry["_id"]}
+    activity_effects.submit(user_id, effect)
+
+async def replay_activity_outbox():
+    """Claim and requeue outbox entries whose owner stopped before applying them."""
+    if not ACTIVITY_OUTBOX:
+        return
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=ACTIVITY_OUTBOX_REPLAY_AFTER_SECONDS)).isoformat()
+    # Entries recorded before claims carry only created_at
+    abandoned = {"$or": [
+        {"claimed_at": {"$lt": cutoff}},
+        {"claimed_at": {"$exists": False}, "created_at": {"$lt": cutoff}},
+    ]}
+    replayed = 0
+    while True:
+        entry = await db.activity_outbox.find_one_and_update(
+            abandoned,
+            {"$set": {"claimed_by": INSTANCE_ID, "claimed_at": datetime.now(timezone.utc).isoformat()}},
+            sort=[("created_at", ASCENDING)],
         )
+        if entry is None:
+            break
+        activity_effects.submit(entry["user_id"], {**entry["effect"], "outbox_id": entry["_id"]})
+        replayed += 1
+    if replayed:
+        logger.info("Replaying %d activity side effect(s) from the outbox", replayed)
 
 app.include_router(api_router)
 
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 logging.basicConfig(
@@ -479,4 +2412,22 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    global _ready
+    _ready = False
+    for task in [_bootstrap_task, *_background_tasks]:
+        if task is not None and not task.done():
+            task.cancel()
+    # Apply the side effects of writes already acknowledged before the client goes
+    await activity_effects.stop()
+    database.close()
+
+# Pool exhaustion, an unreachable server or an operation over its time budget
+# surface as 503/504 rather than as unhandled 500s
+@app.exception_handler(ServerSelectionTimeoutError)
+async def database_unavailable_handler(request: Request, exc: ServerSelectionTimeoutError):
+    return JSONResponse(status_code=503, content={"detail": "Database unavailable"})
+
+@app.exception_handler(ExecutionTimeout)
+@app.exception_handler(NetworkTimeout)
+async def database_timeout_handler(request: Request, exc: Exception):
+    return JSONResponse(status_code=504, content={"detail": "Database operation timed out"})
\ No newline at end of file
@@ -0,0 +1,62 @@
+from typing import Dict
+
+import numpy as np
+
+WEEK = 7
+
+
+def lookback_days(window: int) -> int:
+    """Days of history needed before the first reported day: a full rolling window and two full weeks."""
+    return max(window - 1, 2 * WEEK - 1)
+
+
+def daily_matrix(day_index: np.ndarray, column_index: np.ndarray, minutes: np.ndarray, shape) -> np.ndarray:
+    """Dense days x categories matrix of minutes from (day, category, minutes) triples."""
+    matrix = np.zeros(shape)
+    np.add.at(matrix, (day_index, column_index), minutes)
+    return matrix
+
+
+def trailing_sums(matrix: np.ndarray, window: int) -> np.ndarray:
+    """Each row summed with the `window - 1` rows before it (fewer at the top), via one cumulative sum."""
+    cumulative = np.cumsum(matrix, axis=0)
+    sums = cumulative.copy()
+    sums[window:] -= cumulative[:-window]
+    return sums
+
+
+def compute_trends(matrix: np.ndarray, window: int, lookback: int) -> Dict[str, np.ndarray]:
+    """Trend figures for a days x categories matrix of minutes, oldest day first.
+
+    The first `lookback` rows only feed the rolling figures of the reported
+    days after them. Series are (reported days x categories); summaries have
+    one value per category:
+
+    - rolling_mean: mean daily minutes over the trailing `window` days
+    - week_over_week: trailing 7-day minutes minus the 7 days before those
+    - mean, std: daily minutes over the reported days
+    - active_ratio: share of reported days with any minutes
+    - consistency: 0-100, active_ratio / (1 + coefficient of variation), so
+      it rewards showing up often and putting in similar time each day
+    """
+    weekly = trailing_sums(matrix, WEEK)
+    week_over_week = weekly.copy()
+    week_over_week[WEEK:] -= weekly[:-WEEK]
+    reported = matrix[lookback:]
+    mean = reported.mean(axis=0)
+    std = reported.std(axis=0)
+    active_ratio = (reported > 0).mean(axis=0)
+    variation = np.divide(std, mean, out=np.zeros_like(std), where=mean > 0)
+    previous_week = weekly[-1 - WEEK] if len(weekly) > WEEK else np.zeros(matrix.shape[1])
+    return {
+        "minutes": reported,
+        "rolling_mean": (trailing_sums(matrix, window) / window)[lookback:],
+        "week_over_week": week_over_week[lookback:],
+        "total": reported.sum(axis=0),
+        "mean": mean,
+        "std": std,
+        "active_ratio": active_ratio,
+        "consistency": np.where(mean > 0, 100 * active_ratio / (1 + variation), 0.0),
+        "this_week": weekly[-1],
+        "previous_week": previous_week,
+    }
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingQueue:
+    """In-process background workers for batches of work queued per key.
+
+    Items submitted for a key accumulate until a worker takes the key and
+    hands all of them to `process(key, items)` in one call, so a burst for one
+    key costs one batch. A key is only ever processed by one worker at a time;
+    items that arrive meanwhile become its next batch, which keeps each key's
+    batches in submission order.
+
+    Workers start on the first submit, in the running event loop. join()
+    waits until everything submitted so far has been processed; stop() does
+    the same and then ends the workers.
+    """
+
+    def __init__(self, process: Callable[[Hashable, List[Any]], Awaitable[None]], workers: int = 4):
+        self.process = process
+        self.workers = workers
+        self._pending: Dict[Hashable, List[Any]] = {}
+        self._active: Set[Hashable] = set()
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _start(self):
+        # Also replaces workers left over from an event loop that has ended
+        self._pending.clear()
+        self._active.clear()
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    def submit(self, key: Hashable, item: Any):
+        if not any(not task.done() for task in self._tasks):
+            self._start()
+        if key in self._pending:
+            self._pending[key].append(item)
+            return
+        self._pending[key] = [item]
+        # A key being processed is requeued when its current batch finishes
+        if key not in self._active:
+            self._ready.put_nowait(key)
+
+    @property
+    def backlog(self) -> int:
+        """Items submitted but not yet handed to `process`."""
+        return sum(len(items) for items in self._pending.values())
+
+    async def _run(self):
+        while True:
+            key = await self._ready.get()
+            items = self._pending.pop(key)
+            self._active.add(key)
+            try:
+                await self.process(key, items)
+            except Exception:
+                logger.exception("Background batch of %d item(s) for %r failed", len(items), key)
+            finally:
+                self._active.discard(key)
+                if key in self._pending:
+                    self._ready.put_nowait(key)
+                self._ready.task_done()
+
+    async def join(self):
+        """Wait until every item submitted so far has been processed."""
+        if self._ready is not None and any(not task.done() for task in self._tasks):
+            await self._ready.join()
+
+    async def stop(self):
+        """Process everything queued, then stop the workers."""
+        await self.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._ready = None
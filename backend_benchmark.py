@@ -0,0 +1,819 @@
+"""Benchmarks for the LevelUp Life backend.
+
+Runs against the MongoDB at MONGO_URL using a throwaway database
+(BENCH_DB_NAME, default "levelup_benchmark") that is dropped afterwards.
+With --in-memory the database is a mongomock_motor stand-in instead, which
+needs no mongod but does not implement every aggregation operator the write
+paths use, so their errors are reported rather than timed.
+
+    python backend_benchmark.py analytics --activities 100000
+    python backend_benchmark.py clash --days 30
+    python backend_benchmark.py tenancy --users 1 4 16 64 --writes 2000
+    python backend_benchmark.py api --history-users 4 --years 2 --per-day 6 --requests 500
+    python backend_benchmark.py metrics --requests 200
+    python backend_benchmark.py pool --writes 1000 --concurrency 64
+    python backend_benchmark.py serialization --rows 10000
+    python backend_benchmark.py startup --replicas 8 --repeat 5
+    python backend_benchmark.py trends --years 5 --per-day 6 --categories 24
+    python backend_benchmark.py schema --history-users 4 --years 3 --per-day 6
+
+Results are printed as JSON tagged with the current git commit, so runs can
+be diffed commit to commit.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+os.environ['DB_NAME'] = os.environ.get('BENCH_DB_NAME', 'levelup_benchmark')
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+import bson  # noqa: E402
+from pymongo import ASCENDING, IndexModel  # noqa: E402
+
+import server  # noqa: E402
+
+CATEGORIES = [
+    ("study", "Study"),
+    ("gaming", "Gaming"),
+    ("gym", "Gym"),
+    ("sleep", "Sleep"),
+]
+
+
+def synthetic_activities(count, days, seed=42, user_id=server.DEFAULT_USER_ID):
+    """Generate `count` non-overlapping activities spread over the last `days` days."""
+    rng = random.Random(seed)
+    today = datetime.now(timezone.utc).date()
+    per_day = max(1, -(-count // days))
+    slot = max(1, (24 * 60) // per_day)
+    generated = 0
+    for offset in range(days):
+        date = (today - timedelta(days=offset)).isoformat()
+        for index in range(per_day):
+            if generated == count:
+                return
+            category_id, category_name = rng.choice(CATEGORIES)
+            start = index * slot
+            start_time = f"{start // 60:02d}:{start % 60:02d}"
+            duration = rng.randint(1, slot)
+            start_minute, end_minute = server.activity_interval(date, start_time, duration)
+            yield {
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "category_id": category_id,
+                "category_name": category_name,
+                "date": date,
+                "start_time": start_time,
+                "duration": duration,
+                "start_minute": start_minute,
+                "end_minute": end_minute,
+                "notes": None,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            generated += 1
+
+
+async def seed(count, days, batch_size=5000):
+    await server.db.client.drop_database(server.db.name)
+    await server.ensure_indexes()
+    await server.seed_user(server.DEFAULT_USER_ID)
+    batch = []
+    for activity in synthetic_activities(count, days):
+        batch.append(activity)
+        if len(batch) == batch_size:
+            await server.db.activities.insert_many(batch)
+            batch = []
+    if batch:
+        await server.db.activities.insert_many(batch)
+    await server.rebuild_daily_rollups()
+
+
+async def seed_history(users, years, per_day, seed=42, batch_size=5000):
+    """Seed `users` users with `years` of history at `per_day` activities a day.
+
+    Stats, rollups and goals are brought in line with the history the same way
+    a bulk import would, so every endpoint sees a realistic account.
+    """
+    await server.db.client.drop_database(server.db.name)
+    await server.ensure_indexes()
+    user_ids = [f"bench-user-{index}" for index in range(users)]
+    days = years * 365
+    for index, user_id in enumerate(user_ids):
+        await server.seed_user(user_id)
+        batch = []
+        minutes = 0
+        for activity in synthetic_activities(per_day * days, days, seed=seed + index, user_id=user_id):
+            batch.append(activity)
+            minutes += activity["duration"]
+            if len(batch) == batch_size:
+                await server.db.activities.insert_many(batch)
+                batch = []
+        if batch:
+            await server.db.activities.insert_many(batch)
+        await server.db.goals.insert_many([
+            {"id": f"{user_id}-{period}", "user_id": user_id, "category_id": "study", "category_name": "Study",
+             "target": 60, "period": period, "current_progress": 0, "window_start": None,
+             "created_at": datetime.now(timezone.utc).isoformat()}
+            for period in server.GOAL_PERIODS
+        ])
+    await server.rebuild_daily_rollups()
+    for user_id in user_ids:
+        await server.db.user_stats.update_one({"user_id": user_id}, {"$set": await _stats_for_history(user_id)})
+        await server.check_badges(user_id)
+    await server.recompute_goal_progress()
+    return user_ids
+
+
+async def _stats_for_history(user_id):
+    # Plain values rather than the import pipeline, which the in-memory stand-in cannot run
+    totals = await server.db.daily_rollups.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": None, "minutes": {"$sum": "$duration"}, "count": {"$sum": "$count"}}},
+    ]).to_list(None)
+    minutes, count = (totals[0]["minutes"], totals[0]["count"]) if totals else (0, 0)
+    total_xp = minutes * server.XP_PER_MINUTE
+    level = server.level_for_total_xp(total_xp)
+    current_streak, longest_streak, last_activity_date = await server.compute_streaks(user_id)
+    return {
+        "level": level,
+        "xp": total_xp - server.XP_PER_LEVEL * level * (level - 1) // 2,
+        "total_activities": count,
+        "current_streak": current_streak,
+        "longest_streak": longest_streak,
+        "last_activity_date": last_activity_date,
+    }
+
+
+def latency_summary(samples, elapsed=None):
+    """p50/p95/p99 of `samples` (milliseconds), plus throughput when `elapsed` seconds is given."""
+    quantiles = statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+    summary = {
+        "p50_ms": round(quantiles[49], 2),
+        "p95_ms": round(quantiles[94], 2),
+        "p99_ms": round(quantiles[98], 2),
+    }
+    if elapsed is not None:
+        summary = {"requests_per_second": round(len(samples) / elapsed, 1), **summary}
+    return summary
+
+
+async def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, {
+        "median_ms": round(statistics.median(samples), 2),
+        "min_ms": round(min(samples), 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+
+# Python-side folds over raw activities, as the analytics handlers did before
+# aggregation pipelines and daily rollups, minus the old 1000-row cap so the
+# results are comparable.
+async def legacy_daily_analytics(days):
+    start_date = datetime.now(timezone.utc) - timedelta(days=days)
+    activities = await server.db.activities.find({
+        "user_id": server.DEFAULT_USER_ID,
+        "date": {"$gte": start_date.date().isoformat()}
+    }, {"_id": 0}).to_list(None)
+    daily_data = defaultdict(lambda: defaultdict(int))
+    for activity in activities:
+        daily_data[activity["date"]][activity["category_name"]] += activity["duration"]
+    result = []
+    for i in range(days):
+        date = (start_date + timedelta(days=i)).date().isoformat()
+        data_point = {"date": date}
+        if date in daily_data:
+            data_point.update(daily_data[date])
+        result.append(data_point)
+    return result
+
+
+async def legacy_analytics_summary():
+    start_date = datetime.now(timezone.utc) - timedelta(days=30)
+    activities = await server.db.activities.find({
+        "user_id": server.DEFAULT_USER_ID,
+        "date": {"$gte": start_date.date().isoformat()}
+    }, {"_id": 0}).to_list(None)
+    category_totals = defaultdict(int)
+    for activity in activities:
+        category_totals[activity["category_name"]] += activity["duration"]
+    return {"category_totals": dict(category_totals), "total_activities": len(activities)}
+
+
+async def legacy_category_analytics(category_id, days):
+    start_date = datetime.now(timezone.utc) - timedelta(days=days)
+    activities = await server.db.activities.find({
+        "user_id": server.DEFAULT_USER_ID,
+        "category_id": category_id,
+        "date": {"$gte": start_date.date().isoformat()}
+    }, {"_id": 0}).to_list(None)
+    daily_totals = defaultdict(int)
+    for activity in activities:
+        daily_totals[activity["date"]] += activity["duration"]
+    return [
+        {"date": (start_date + timedelta(days=i)).date().isoformat(),
+         "duration": daily_totals.get((start_date + timedelta(days=i)).date().isoformat(), 0)}
+        for i in range(days)
+    ]
+
+
+async def bench_analytics(args):
+    """Rollup-backed /analytics/* handlers vs. Python folds over raw activities."""
+    await seed(args.activities, args.days)
+    user_id = server.DEFAULT_USER_ID
+    cases = {
+        "summary": (lambda: server.get_analytics_summary(user_id=user_id), legacy_analytics_summary),
+        "daily": (lambda: server.get_daily_analytics(days=args.days, user_id=user_id),
+                  lambda: legacy_daily_analytics(args.days)),
+        "category": (lambda: server.get_category_analytics("study", days=args.days, user_id=user_id),
+                     lambda: legacy_category_analytics("study", args.days)),
+    }
+    report = {}
+    for name, (handler, legacy) in cases.items():
+        handler_result, handler_timing = await timed(handler, args.repeat)
+        legacy_result, legacy_timing = await timed(legacy, args.repeat)
+        report[name] = {
+            "handler": handler_timing,
+            "python_fold": legacy_timing,
+            "results_match": handler_result == legacy_result,
+        }
+    return report
+
+
+# The clash check create_activity used before start_minute/end_minute:
+# fetch the whole day and compare every interval in Python.
+async def legacy_find_clash(date, start_time, duration):
+    hour, minute = map(int, start_time.split(':'))
+    new_start = hour * 60 + minute
+    new_end = new_start + duration
+    for existing in await server.db.activities.find({"user_id": server.DEFAULT_USER_ID, "date": date}, {"_id": 0}).to_list(None):
+        ex_hour, ex_minute = map(int, existing['start_time'].split(':'))
+        ex_start = ex_hour * 60 + ex_minute
+        if not (new_end <= ex_start or new_start >= ex_start + existing['duration']):
+            return existing
+    return None
+
+
+async def bench_clash(args):
+    """Clash check latency as the number of activities per day grows."""
+    report = {}
+    for per_day in (10, 100, 500):
+        await seed(per_day * args.days, args.days)
+        # A free slot at the very end of yesterday, after the densest packing
+        date = (datetime.now(timezone.utc).date() - timedelta(days=1)).isoformat()
+        start_minute, end_minute = server.activity_interval(date, "23:59", 1)
+        await server.db.activities.delete_many({"start_minute": {"$lt": end_minute}, "end_minute": {"$gt": start_minute}})
+        _, indexed = await timed(lambda: server.find_clashing_activity(server.DEFAULT_USER_ID, start_minute, end_minute), args.repeat)
+        _, legacy = await timed(lambda: legacy_find_clash(date, "23:59", 1), args.repeat)
+        report[f"{per_day}_per_day"] = {"interval_index": indexed, "day_scan": legacy}
+    return report
+
+
+async def _create_activities(user_ids, writes, concurrency, future=False):
+    """Issue `writes` create_activity calls round-robin over `user_ids`; returns per-call latencies.
+
+    Activities go on past days, or on future ones (clear of any seeded
+    history) with `future`.
+    """
+    today = datetime.now(timezone.utc).date()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def create(index):
+        user_id = user_ids[index % len(user_ids)]
+        # Each user's n-th activity gets its own half-hour slot, so nothing clashes
+        slot = index // len(user_ids)
+        activity = server.ActivityCreate(
+            category_id="study",
+            category_name="Study",
+            date=(today + timedelta(days=1 + slot // 48) if future else today - timedelta(days=slot // 48)).isoformat(),
+            start_time=f"{(slot % 48) // 2:02d}:{(slot % 2) * 30:02d}",
+            duration=30,
+        )
+        async with semaphore:
+            started = time.perf_counter()
+            await server.create_activity(activity, user_id=user_id)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(create(index) for index in range(writes)))
+    return latencies
+
+
+async def bench_tenancy(args):
+    """create_activity throughput at a fixed concurrency as the writes spread over more users."""
+    report = {}
+    for user_count in args.users:
+        await server.db.client.drop_database(server.db.name)
+        await server.ensure_indexes()
+        user_ids = [f"bench-user-{index}" for index in range(user_count)]
+        await asyncio.gather(*(server.seed_user(user_id) for user_id in user_ids))
+        started = time.perf_counter()
+        latencies = await _create_activities(user_ids, args.writes, args.concurrency)
+        elapsed = time.perf_counter() - started
+        # Stats, badges and rollups are applied in the background; time until they are
+        await server.activity_effects.join()
+        report[f"{user_count}_users"] = {
+            **latency_summary(latencies, elapsed),
+            "settled_seconds": round(time.perf_counter() - started, 3),
+        }
+    baseline = report[f"{args.users[0]}_users"]["requests_per_second"]
+    for result in report.values():
+        result["speedup"] = round(result["requests_per_second"] / baseline, 2)
+    return report
+
+
+def api_routes(history_days):
+    """Routes for the api benchmark as (name, method, path, body) tuples.
+
+    path and body are called with the user and that user's request number.
+    Writes land on future days, clear of the seeded history, and the delete
+    route removes the activities the create route made; their ids are kept
+    in the returned `created` map.
+    """
+    today = datetime.now(timezone.utc).date()
+    month_ago = (today - timedelta(days=30)).isoformat()
+    created = defaultdict(list)
+
+    def new_activity(user, index):
+        return {
+            "category_id": "study",
+            "category_name": "Study",
+            "date": (today + timedelta(days=1 + index // 48)).isoformat(),
+            "start_time": f"{(index % 48) // 2:02d}:{(index % 2) * 30:02d}",
+            "duration": 30,
+        }
+
+    def created_activity(user, index):
+        return f"/api/activities/{created[user].pop()}" if created[user] else "/api/activities/missing"
+
+    def imported_rows(user, index):
+        # A year out, clear of the create route's days
+        date = (today + timedelta(days=366 + index)).isoformat()
+        return [
+            {"category_id": "study", "category_name": "Study", "date": date, "start_time": f"{hour:02d}:00", "duration": 45}
+            for hour in range(0, 24, 3)
+        ]
+
+    return created, [
+        ("GET /api/categories", "GET", lambda user, index: "/api/categories", None),
+        ("GET /api/stats", "GET", lambda user, index: "/api/stats", None),
+        ("GET /api/badges", "GET", lambda user, index: "/api/badges", None),
+        ("GET /api/goals", "GET", lambda user, index: "/api/goals", None),
+        ("GET /api/dashboard", "GET", lambda user, index: "/api/dashboard", None),
+        ("GET /api/activities", "GET", lambda user, index: "/api/activities?limit=100", None),
+        ("GET /api/analytics/summary", "GET", lambda user, index: "/api/analytics/summary", None),
+        ("GET /api/analytics/daily", "GET", lambda user, index: "/api/analytics/daily?days=30", None),
+        ("GET /api/analytics/category/{id}", "GET", lambda user, index: "/api/analytics/category/study?days=30", None),
+        ("GET /api/analytics/heatmap", "GET", lambda user, index: "/api/analytics/heatmap", None),
+        ("GET /api/analytics/trends", "GET", lambda user, index: "/api/analytics/trends?days=90&window=7", None),
+        ("GET /api/analytics/hourly", "GET", lambda user, index: "/api/analytics/hourly?days=90", None),
+        ("GET /api/timeline/{date}", "GET",
+         lambda user, index: f"/api/timeline/{(today - timedelta(days=index % history_days)).isoformat()}", None),
+        ("GET /api/timeline?from&to", "GET",
+         lambda user, index: f"/api/timeline?from={(today - timedelta(days=6)).isoformat()}&to={today.isoformat()}", None),
+        ("GET /api/export/activities?format=ndjson", "GET",
+         lambda user, index: f"/api/export/activities?format=ndjson&start_date={month_ago}", None),
+        ("GET /api/export/activities?format=csv", "GET",
+         lambda user, index: f"/api/export/activities?format=csv&start_date={month_ago}", None),
+        ("GET /api/cache/stats", "GET", lambda user, index: "/api/cache/stats", None),
+        ("POST /api/activities", "POST", lambda user, index: "/api/activities", new_activity),
+        ("POST /api/activities/bulk", "POST", lambda user, index: "/api/activities/bulk", imported_rows),
+        ("DELETE /api/activities/{id}", "DELETE", created_activity, None),
+    ]
+
+
+async def bench_api(args):
+    """Concurrent load on every endpoint through the ASGI app, per-route throughput and latency."""
+    import httpx
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    user_ids = await seed_history(args.history_users, args.years, args.per_day)
+    created, routes = api_routes(args.years * 365)
+    # Handler exceptions come back as 500s and are counted, not raised
+    transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+    report = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for name, method, path, body in routes:
+            semaphore = asyncio.Semaphore(args.concurrency)
+            latencies = []
+            statuses = defaultdict(int)
+
+            async def call(index):
+                user = user_ids[index % len(user_ids)]
+                request_path = path(user, index // len(user_ids))
+                payload = body(user, index // len(user_ids)) if body else None
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.request(method, request_path, json=payload, headers={"X-User-Id": user})
+                    latencies.append((time.perf_counter() - started) * 1000)
+                statuses[response.status_code] += 1
+                if name == "POST /api/activities" and response.status_code == 200:
+                    created[user].append(response.json()["id"])
+
+            started = time.perf_counter()
+            await asyncio.gather(*(call(index) for index in range(args.requests)))
+            report[name] = {
+                **latency_summary(latencies, time.perf_counter() - started),
+                "errors": sum(count for status, count in statuses.items() if status >= 400),
+            }
+    return report
+
+
+async def bench_pool(args):
+    """create_activity latency under concurrent analytics load, with analytics on the write pool vs. their own.
+
+    The effect shows once readers outnumber the write pool, e.g. with
+    MONGO_MAX_POOL_SIZE=16 and --concurrency 64.
+    """
+    user_ids = await seed_history(args.history_users, args.years, args.per_day)
+    analytics_client = server.database.analytics_client
+    report = {}
+    for mode in ("shared_pool", "analytics_pool"):
+        # shared_pool reproduces the single-client setup: analytics borrow write connections
+        server.database.analytics_client = server.database.client if mode == "shared_pool" else analytics_client
+        await server.db.activities.delete_many({"date": {"$gt": datetime.now(timezone.utc).date().isoformat()}})
+        stop = asyncio.Event()
+
+        async def analytics_load(user_id):
+            while not stop.is_set():
+                await server.get_analytics_summary(user_id=user_id)
+                await server.get_category_analytics("study", days=args.years * 365, user_id=user_id)
+
+        readers = [asyncio.create_task(analytics_load(user_ids[index % len(user_ids)])) for index in range(args.concurrency)]
+        try:
+            started = time.perf_counter()
+            latencies = await _create_activities(user_ids, args.writes, max(1, args.concurrency // 8), future=True)
+            report[mode] = latency_summary(latencies, time.perf_counter() - started)
+        finally:
+            stop.set()
+            await asyncio.gather(*readers)
+    server.database.analytics_client = analytics_client
+    return report
+
+
+def _per_call_ns(fn, calls=100_000):
+    started = time.perf_counter_ns()
+    for index in range(calls):
+        fn(index)
+    return round((time.perf_counter_ns() - started) / calls, 1)
+
+
+async def bench_metrics(args):
+    """Cost of request and MongoDB command instrumentation, per call and per request."""
+    import httpx
+    from types import SimpleNamespace
+
+    from metrics import CommandMetrics, MetricsRegistry
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    registry = MetricsRegistry()
+    listener = CommandMetrics(registry)
+    started_event = SimpleNamespace(command_name="find", command={"find": "activities"}, connection_id=("localhost", 27017))
+
+    def command_round_trip(index):
+        started_event.request_id = index
+        listener.started(started_event)
+        listener.succeeded(SimpleNamespace(connection_id=started_event.connection_id, request_id=index, duration_micros=800))
+
+    report = {
+        "histogram_observe_ns": _per_call_ns(lambda index: registry.http_requests.observe(("GET", "/api/stats", "200"), 0.001)),
+        "command_listener_ns": _per_call_ns(command_round_trip),
+    }
+
+    # Same app and requests with recording switched on and off, interleaved
+    # so drift in the machine or database affects both sides alike
+    user_ids = await seed_history(1, 1, args.per_day)
+    transport = httpx.ASGITransport(app=server.app)
+    routes = {"GET /api/stats": "/api/stats", "GET /api/activities": "/api/activities?limit=100"}
+    samples = {(name, enabled): [] for name in routes for enabled in (False, True)}
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", headers={"X-User-Id": user_ids[0]}) as client:
+        for _ in range(args.repeat):
+            for enabled in (False, True):
+                server.metrics.enabled = enabled
+                for name, path in routes.items():
+                    for _ in range(args.requests):
+                        started = time.perf_counter()
+                        await client.get(path)
+                        samples[(name, enabled)].append((time.perf_counter() - started) * 1000)
+    server.metrics.enabled = True
+    for name in routes:
+        off = statistics.median(samples[(name, False)])
+        on = statistics.median(samples[(name, True)])
+        report[name] = {
+            "median_ms_off": round(off, 3),
+            "median_ms_on": round(on, 3),
+            "overhead_us": round((on - off) * 1000, 1),
+        }
+    return report
+
+
+async def bench_serialization(args):
+    """Encoding a page of Activity rows: response_model validation + stdlib JSON vs. trusted fields + orjson."""
+    from typing import List
+
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+
+    field = create_response_field(name="activities", type_=List[server.Activity])
+    projection = server.ACTIVITY_FIELDS.projection
+    rows = [
+        {name: value for name, value in activity.items() if name in projection}
+        for activity in synthetic_activities(args.rows, max(1, args.rows // 10))
+    ]
+
+    async def validated_stdlib():
+        content = await serialize_response(field=field, response_content=[dict(row) for row in rows])
+        return JSONResponse(content).body
+
+    async def validated_orjson():
+        content = await serialize_response(field=field, response_content=[dict(row) for row in rows])
+        return ORJSONResponse(content).body
+
+    async def trusted_orjson():
+        return ORJSONResponse(server.ACTIVITY_FIELDS.fill([dict(row) for row in rows])).body
+
+    report = {}
+    for name, fn in (("validated_stdlib_json", validated_stdlib), ("validated_orjson", validated_orjson), ("trusted_orjson", trusted_orjson)):
+        body, report[name] = await timed(fn, args.repeat)
+        report[name]["bytes"] = len(body)
+    report["speedup"] = round(report["validated_stdlib_json"]["median_ms"] / report["trusted_orjson"]["median_ms"], 1)
+    report["same_payload"] = json.loads(await validated_stdlib()) == json.loads(await trusted_orjson())
+    return report
+
+
+async def bench_startup(args):
+    """Startup bootstrap time on an empty database, on a bootstrapped one, and with replicas starting at once."""
+    async def cold_start(replicas):
+        await server.db.client.drop_database(server.db.name)
+        server._seeded_users.clear()
+        started = time.perf_counter()
+        # Each replica's bootstrap, with nothing seeded yet as far as it knows
+        await asyncio.gather(*(server.bootstrap() for _ in range(replicas)))
+        return round((time.perf_counter() - started) * 1000, 2)
+
+    async def warm_start():
+        server._seeded_users.clear()
+        await server.bootstrap()
+
+    report = {"cold_ms": await cold_start(1)}
+    _, report["warm"] = await timed(warm_start, args.repeat)
+    report[f"cold_{args.replicas}_replicas_ms"] = await cold_start(args.replicas)
+    # Concurrent seeding must still leave exactly one set of defaults
+    report["seeded"] = {
+        collection: await server.db[collection].count_documents({"user_id": server.DEFAULT_USER_ID})
+        for collection in ("categories", "badges", "user_stats")
+    }
+    return report
+
+
+def python_trends(matrix, window, lookback):
+    """The trend figures computed day by day and category by category in plain Python, as a baseline."""
+    rows = matrix.tolist()
+    reported = rows[lookback:]
+    result = []
+    for column in range(len(rows[0]) if rows else 0):
+        values = [row[column] for row in rows]
+        rolling = [sum(values[max(0, day - window + 1):day + 1]) / window for day in range(len(values))]
+        weekly = [sum(values[max(0, day - 6):day + 1]) for day in range(len(values))]
+        week_over_week = [weekly[day] - (weekly[day - 7] if day >= 7 else 0) for day in range(len(values))]
+        period = [row[column] for row in reported]
+        mean = statistics.fmean(period)
+        std = statistics.pstdev(period)
+        active = sum(1 for value in period if value > 0) / len(period)
+        consistency = 100 * active / (1 + std / mean) if mean else 0.0
+        result.append((rolling[lookback:], week_over_week[lookback:], mean, std, consistency))
+    return result
+
+
+async def bench_trends(args):
+    """GET /analytics/trends over multi-year windows, and its NumPy core against a plain-Python baseline."""
+    import numpy as np
+    from trends import compute_trends, lookback_days
+
+    (user_id,) = await seed_history(1, args.years, args.per_day)
+    days = args.years * 365
+    report = {}
+    for window in (7, 30):
+        _, report[f"endpoint_{args.years}y_window_{window}"] = await timed(
+            lambda: server.get_trends(days=days, window=window, user_id=user_id), args.repeat
+        )
+    # The computation alone, on a synthetic matrix as wide as --categories
+    lookback = lookback_days(30)
+    matrix = np.random.default_rng(42).integers(0, 120, size=(days + lookback, args.categories)).astype(float)
+    async def numpy_core():
+        return compute_trends(matrix, 30, lookback)
+    async def python_core():
+        return python_trends(matrix, 30, lookback)
+    _, report["numpy_core"] = await timed(numpy_core, args.repeat)
+    _, report["python_core"] = await timed(python_core, max(1, args.repeat // 5))
+    report["speedup"] = round(report["python_core"]["median_ms"] / report["numpy_core"]["median_ms"], 1)
+    return report
+
+
+# The activity indexes that schema 1 listings and analytics read through, on
+# the date and start_time strings
+SCHEMA_1_INDEXES = [
+    IndexModel([("user_id", ASCENDING), ("date", ASCENDING), ("start_time", ASCENDING), ("id", ASCENDING)], name="user_id_date_start_time_id"),
+    IndexModel([("user_id", ASCENDING), ("category_id", ASCENDING), ("date", ASCENDING), ("start_time", ASCENDING), ("id", ASCENDING)], name="user_id_category_id_date_start_time_id"),
+]
+
+
+async def activity_storage():
+    """Average BSON size of an activity, plus collStats sizes where the database reports them."""
+    sample = await server.db.activities.find({}).limit(1000).to_list(None)
+    report = {"avg_document_bytes": round(statistics.fmean(len(bson.encode(document)) for document in sample), 1)}
+    try:
+        stats = await server.db.command("collStats", "activities")
+    except Exception:
+        # The in-memory stand-in has no collStats
+        return report
+    report["data_bytes"] = stats["size"]
+    report["index_bytes"] = stats["totalIndexSize"]
+    report["index_bytes_by_name"] = stats["indexSizes"]
+    return report
+
+
+async def _drain(response):
+    size = 0
+    async for chunk in response.body_iterator:
+        size += len(chunk)
+    return size
+
+
+async def _time_activity_reads(user_id, repeat):
+    """Latency and results of the handlers that read raw activities."""
+    today = datetime.now(timezone.utc).date()
+    month_ago = (today - timedelta(days=30)).isoformat()
+    week_start = datetime.combine(today - timedelta(days=6), datetime.min.time())
+    clash_start, clash_end = server.activity_interval(today.isoformat(), "12:00", 30)
+
+    async def clash_check():
+        clash = await server.find_clashing_activity(user_id, clash_start, clash_end)
+        return clash and await server.clash_message(user_id, clash)
+
+    async def export_ndjson():
+        return await _drain(await server.export_activities(
+            format="ndjson", category_id=None, start_date=None, end_date=None, user_id=user_id
+        ))
+
+    reads = {
+        "list_page": lambda: server.get_activities(
+            category_id=None, start_date=None, end_date=None, cursor=None, limit=1000, format="json", user_id=user_id
+        ),
+        "list_month_in_category": lambda: server.get_activities(
+            category_id="study", start_date=month_ago, end_date=today.isoformat(), cursor=None, limit=1000, format="json", user_id=user_id
+        ),
+        "clash_check": clash_check,
+        "timeline_week": lambda: server.load_timeline(user_id, week_start, week_start + timedelta(days=6)),
+        "hourly_90_days": lambda: server.get_hourly_distribution(category_id=None, days=90, user_id=user_id),
+        "export_ndjson": export_ndjson,
+    }
+    timings, results = {}, {}
+    for name, read in reads.items():
+        results[name], timings[name] = await timed(read, repeat)
+    # Compared without created_at, which schema 2 keeps to the millisecond and
+    # the seed wrote to the microsecond; the export is only counted in bytes
+    def without_created_at(activities):
+        return [{key: value for key, value in activity.items() if key != "created_at"} for activity in activities]
+
+    results["list_page"] = without_created_at(json.loads(results["list_page"].body))
+    results["list_month_in_category"] = without_created_at(json.loads(results["list_month_in_category"].body))
+    results["timeline_week"] = without_created_at(results["timeline_week"]["activities"])
+    del results["export_ndjson"]
+    return timings, results
+
+
+async def bench_schema(args):
+    """Activity document and index sizes, and read latency, before and after the schema 2 migration."""
+    user_ids = await seed_history(args.history_users, args.years, args.per_day)
+    # The seed writes schema 1 documents; give them the indexes they had
+    await server.db.activities.create_indexes(SCHEMA_1_INDEXES)
+    before_storage = await activity_storage()
+    before, before_results = await _time_activity_reads(user_ids[0], args.repeat)
+
+    started = time.perf_counter()
+    migrated = await server.migrate_activities()
+    migration_seconds = time.perf_counter() - started
+    for index in SCHEMA_1_INDEXES:
+        await server.db.activities.drop_index(index.document["name"])
+    after_storage = await activity_storage()
+    after, after_results = await _time_activity_reads(user_ids[0], args.repeat)
+
+    return {
+        "migration": {
+            "migrated": migrated,
+            "seconds": round(migration_seconds, 3),
+            "per_second": round(migrated / migration_seconds, 1) if migration_seconds else None,
+        },
+        "storage": {"schema_1": before_storage, "schema_2": after_storage},
+        "reads": {
+            name: {
+                "schema_1": before[name],
+                "schema_2": after[name],
+                "speedup": round(before[name]["median_ms"] / after[name]["median_ms"], 2),
+            }
+            for name in before
+        },
+        "results_match": {name: before_results[name] == after_results[name] for name in before_results},
+    }
+
+
+def use_in_memory_database():
+    from mongomock_motor import AsyncMongoMockClient
+
+    server.database.connect(client=AsyncMongoMockClient())
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+BENCHMARKS = {
+    "analytics": bench_analytics,
+    "clash": bench_clash,
+    "tenancy": bench_tenancy,
+    "api": bench_api,
+    "metrics": bench_metrics,
+    "pool": bench_pool,
+    "serialization": bench_serialization,
+    "startup": bench_startup,
+    "trends": bench_trends,
+    "schema": bench_schema,
+}
+
+# Benchmarks that never touch the database
+OFFLINE_BENCHMARKS = {"serialization"}
+
+
+async def run(args):
+    server.database.connect()
+    # Each benchmark seeds its own database instead of running the startup
+    # bootstrap, so requests through the app are let in straight away
+    server._ready = True
+    try:
+        report = await BENCHMARKS[args.benchmark](args)
+        await server.activity_effects.join()
+        if not args.keep and args.benchmark not in OFFLINE_BENCHMARKS:
+            await server.db.client.drop_database(server.db.name)
+    finally:
+        await server.activity_effects.stop()
+        server.database.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--activities", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365 * 3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16, 64], help="user counts for the tenancy benchmark")
+    parser.add_argument("--writes", type=int, default=2000, help="activities created per run (tenancy, pool)")
+    parser.add_argument("--concurrency", type=int, default=64, help="in-flight requests (tenancy, api, pool)")
+    parser.add_argument("--history-users", type=int, default=4, help="users seeded with history (api, schema)")
+    parser.add_argument("--years", type=int, default=1, help="years of history per user (api, trends, schema)")
+    parser.add_argument("--per-day", type=int, default=6, help="activities per day of history (api, trends, schema)")
+    parser.add_argument("--requests", type=int, default=500, help="requests per route (api, metrics)")
+    parser.add_argument("--categories", type=int, default=24, help="matrix columns for the trends core timing")
+    parser.add_argument("--replicas", type=int, default=8, help="replicas bootstrapping at once (startup)")
+    parser.add_argument("--rows", type=int, default=10_000, help="Activity rows encoded per run (serialization)")
+    parser.add_argument("--in-memory", action="store_true", help="use a mongomock_motor database instead of MONGO_URL")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark database afterwards")
+    args = parser.parse_args()
+    if args.in_memory:
+        use_in_memory_database()
+    report = asyncio.run(run(args))
+    print(json.dumps({
+        "benchmark": args.benchmark,
+        "commit": git_commit(),
+        "activities": args.activities,
+        "results": report,
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
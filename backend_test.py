@@ -1,7 +1,23 @@
 import requests
 import sys
+import os
 import json
-from datetime import datetime, timedelta
+import base64
+import random
+import time
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+def load_backend():
+    """Import the backend app for the in-process checks"""
+    os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    os.environ.setdefault('DB_NAME', 'levelup_test')
+    sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+    import server
+    return server
 
 class ProgressTrackingAPITester:
     def __init__(self, base_url="https://progress-pulse-122.preview.emergentagent.com"):
@@ -69,6 +85,305 @@ class ProgressTrackingAPITester:
             })
             return False, {}
 
+    def record_check(self, name, success, description=""):
+        """Record a pass/fail check that is not a single HTTP call"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ Passed - {name}")
+        else:
+            print(f"❌ Failed - {name}")
+        self.test_results.append({
+            "name": name,
+            "success": success,
+            "description": description
+        })
+        return success
+
+    def run_in_process(self, name, check):
+        """Run an async check against the backend in this process, on a fresh mongomock_motor database"""
+        print(f"\n🔍 Testing {name} (in process)...")
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+
+            server = load_backend()
+
+            async def run():
+                server.database.connect(client=AsyncMongoMockClient())
+                server._ready = True
+                server._seeded_users.clear()
+                server.cache.invalidate_prefix("")
+                try:
+                    await check(server)
+                finally:
+                    await server.activity_effects.stop()
+                    server.database.close()
+
+            asyncio.run(run())
+        except Exception as e:
+            self.record_check(name, False, f"{type(e).__name__}: {e}")
+
+    def seed_activity(self, server, user_id, date, start_time, duration, category_id="study"):
+        """Insert an activity document directly, bypassing the API's checks"""
+        start_minute, end_minute = server.activity_interval(date, start_time, duration)
+        activity = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "category_id": category_id,
+            "category_name": category_id.title(),
+            "date": date,
+            "start_time": start_time,
+            "duration": duration,
+            "start_minute": start_minute,
+            "end_minute": end_minute,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        }
+        return server.db.activities.insert_one(server.activity_document(activity, {}))
+
+    def test_clash_with_overlapping_stored_activities(self):
+        """Clash checks must not assume stored activities never overlap"""
+        print("\n" + "="*50)
+        print("TESTING CLASH CHECK OVER OVERLAPPING STORED ACTIVITIES")
+        print("="*50)
+
+        async def check(server):
+            import httpx
+
+            # 08:00-12:00 and an overlapping 09:00-09:30, as two racing creates
+            # could leave them; 11:00 clashes only with the long one
+            await self.seed_activity(server, "default", "2024-06-05", "08:00", 240)
+            await self.seed_activity(server, "default", "2024-06-05", "09:00", 30)
+            row = {"category_id": "study", "category_name": "Study", "date": "2024-06-05", "start_time": "11:00", "duration": 30}
+
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                created = await client.post("/api/activities", json=row)
+                self.record_check(
+                    "Create reports the clash with the earlier, longer activity",
+                    created.status_code == 400 and "from 08:00" in created.json().get("detail", ""),
+                    f"{created.status_code} {created.text[:200]}"
+                )
+                imported = (await client.post("/api/activities/bulk", json=[row])).json()
+                self.record_check(
+                    "Import reports the clash with the earlier, longer activity",
+                    imported.get("inserted") == 0 and "from 08:00" in str(imported.get("errors")),
+                    json.dumps(imported)[:200]
+                )
+
+        self.run_in_process("Clash with overlapping stored activities", check)
+
+    def test_coalescing_queue(self):
+        """Submits for a key coalesce into one batch, in order, and a failing batch does not stop the workers"""
+        print("\n" + "="*50)
+        print("TESTING COALESCING QUEUE")
+        print("="*50)
+
+        load_backend()
+        from worker import CoalescingQueue
+
+        async def check():
+            batches = []
+            release = asyncio.Event()
+
+            async def process(key, items):
+                batches.append((key, list(items)))
+                if key == "fail":
+                    raise RuntimeError("batch failed")
+                await release.wait()
+
+            queue = CoalescingQueue(process, workers=2)
+            for i in range(100):
+                queue.submit("a", i)
+            queue.submit("fail", 0)
+            # Let the workers take the first batches, then add to the busy key
+            while len(batches) < 2:
+                await asyncio.sleep(0.01)
+            for i in range(100, 150):
+                queue.submit("a", i)
+            queue.submit("fail", 1)
+            release.set()
+            await queue.join()
+            await queue.stop()
+
+            a_batches = [items for key, items in batches if key == "a"]
+            self.record_check(
+                "100 submits for one key coalesce into one batch",
+                a_batches[:1] == [list(range(100))],
+                f"first batch sizes: {[len(items) for items in a_batches]}"
+            )
+            self.record_check(
+                "Submits during processing become the key's next batch, in order",
+                a_batches[1:] == [list(range(100, 150))],
+                f"batch sizes: {[len(items) for items in a_batches]}"
+            )
+            self.record_check(
+                "A failing batch leaves the workers running",
+                [items for key, items in batches if key == "fail"] == [[0], [1]],
+                str([items for key, items in batches if key == "fail"])
+            )
+
+        try:
+            asyncio.run(asyncio.wait_for(check(), timeout=10))
+        except Exception as e:
+            self.record_check("Coalescing queue", False, f"{type(e).__name__}: {e}")
+
+    def test_outbox_replay_after_failure(self):
+        """A batch that fails leaves its outbox entry, and a later replay applies and clears it"""
+        print("\n" + "="*50)
+        print("TESTING ACTIVITY OUTBOX REPLAY")
+        print("="*50)
+
+        async def check(server):
+            # A delete's effect: the activity's rollup comes back out
+            activity = {"user_id": "default", "date": "2024-06-05", "category_id": "study", "category_name": "Study", "duration": 30}
+            await server.apply_rollup_changes([(activity, 1)])
+            apply_rollup_changes = server.apply_rollup_changes
+
+            async def failing(changes):
+                raise RuntimeError("database went away")
+
+            outbox, replay_after = server.ACTIVITY_OUTBOX, server.ACTIVITY_OUTBOX_REPLAY_AFTER_SECONDS
+            server.ACTIVITY_OUTBOX = True
+            try:
+                server.apply_rollup_changes = failing
+                await server.queue_activity_effects("default", server.activity_effect(activity, -1))
+                await server.activity_effects.join()
+                self.record_check(
+                    "Failed batch leaves its outbox entry",
+                    await server.db.activity_outbox.count_documents({}) == 1
+                )
+
+                server.apply_rollup_changes = apply_rollup_changes
+                # The failed process's claim counts as abandoned straight away
+                server.ACTIVITY_OUTBOX_REPLAY_AFTER_SECONDS = 0
+                await server.replay_activity_outbox()
+                await server.activity_effects.join()
+                self.record_check(
+                    "Replay applies the effect and clears the entry",
+                    await server.db.activity_outbox.count_documents({}) == 0
+                    and await server.db.daily_rollups.count_documents({"user_id": "default", "date": "2024-06-05"}) == 0
+                )
+            finally:
+                server.apply_rollup_changes = apply_rollup_changes
+                server.ACTIVITY_OUTBOX, server.ACTIVITY_OUTBOX_REPLAY_AFTER_SECONDS = outbox, replay_after
+
+        self.run_in_process("Outbox replay after a failed batch", check)
+
+    def test_windowed_streaks(self):
+        """Streaks updated from the days around a batch match a recompute over the whole history"""
+        print("\n" + "="*50)
+        print("TESTING WINDOWED STREAKS")
+        print("="*50)
+
+        async def check(server):
+            first = datetime(2024, 1, 1)
+
+            def activity(day, start_time="10:00", duration=30):
+                date = (first + timedelta(days=day)).date().isoformat()
+                return {"user_id": "default", "date": date, "category_id": "study", "category_name": "Study",
+                        "start_time": start_time, "duration": duration}
+
+            stored = (0, 0, None)
+
+            async def apply(changes):
+                nonlocal stored
+                await server.apply_rollup_changes(changes)
+                created = [change["date"] for change, sign in changes if sign > 0]
+                current, longest, last = await server.compute_streaks_around("default", created)
+                stored = (current, max(stored[1], longest), last)
+                return stored == await server.compute_streaks("default")
+
+            steps = {
+                # Runs of 10 and 49 days (longer than the 32-day window) split by gaps
+                "history with gaps": [(activity(day), 1) for day in list(range(0, 10)) + list(range(11, 60)) + [61, 62]],
+                "bridging two gaps into one long run": [(activity(10), 1), (activity(60), 1)],
+                "backdated activity before the history": [(activity(-5), 1)],
+                # Dated by its start, so it extends the run by one day, not two
+                "activity crossing midnight": [(activity(63, "23:30", 60), 1)],
+                "create and delete after midnight in one batch": [(activity(64, "00:10"), 1), (activity(64, "00:10"), -1)],
+                "next day after a deleted one": [(activity(65, "00:05"), 1)],
+            }
+            for name, changes in steps.items():
+                matches = await apply(changes)
+                self.record_check(f"Windowed streaks match full recompute: {name}", matches, str(stored))
+
+            rng = random.Random(7)
+            mismatches = 0
+            for _ in range(50):
+                changes = [(activity(rng.randrange(-30, 120)), 1) for _ in range(rng.randrange(1, 5))]
+                mismatches += not await apply(changes)
+            self.record_check("Windowed streaks match full recompute: 50 random batches", mismatches == 0, f"{mismatches} mismatches")
+
+        self.run_in_process("Windowed streaks", check)
+
+    def test_compute_trends(self):
+        """compute_trends on hand-checked matrices: no activity, a category new after the lookback, window edges"""
+        print("\n" + "="*50)
+        print("TESTING TREND COMPUTATION")
+        print("="*50)
+
+        load_backend()
+        import numpy as np
+        from trends import compute_trends, lookback_days
+
+        def close(actual, expected):
+            return bool(np.allclose(actual, expected))
+
+        # No activity at all: every figure is 0, none is NaN
+        lookback = lookback_days(7)
+        trends = compute_trends(np.zeros((lookback + 30, 2)), 7, lookback)
+        self.record_check(
+            "Empty window gives zeros, not NaN",
+            all(not np.isnan(values).any() and not values.any() for values in trends.values())
+            and trends["rolling_mean"].shape == (30, 2),
+            str({name: values.tolist() for name, values in trends.items() if np.isnan(values).any()})
+        )
+
+        # Column 1 has nothing in the lookback and 10 minutes on each reported day
+        lookback = lookback_days(3)
+        matrix = np.zeros((lookback + 5, 2))
+        matrix[:, 0] = 20
+        matrix[lookback:, 1] = 10
+        trends = compute_trends(matrix, 3, lookback)
+        self.record_check(
+            "Rolling mean of a category missing in the lookback ramps up over the window",
+            close(trends["rolling_mean"][:, 1], [10 / 3, 20 / 3, 10, 10, 10]) and close(trends["rolling_mean"][:, 0], 20),
+            str(trends["rolling_mean"].tolist())
+        )
+        self.record_check(
+            "Week over week of a category missing in the lookback counts from zero",
+            close(trends["week_over_week"][:, 1], [10, 20, 30, 40, 50]) and close(trends["week_over_week"][:, 0], 0),
+            str(trends["week_over_week"].tolist())
+        )
+        self.record_check(
+            "Summaries cover only the reported days",
+            close(trends["total"], [100, 50]) and close(trends["mean"], [20, 10])
+            and close(trends["active_ratio"], [1, 1]) and close(trends["consistency"], [100, 100]),
+            str({name: trends[name].tolist() for name in ("total", "mean", "active_ratio", "consistency")})
+        )
+
+        # Fewer rows than the window at the top: the sums are partial but the
+        # divisor stays the full window
+        trends = compute_trends(np.array([[3.0], [6.0], [9.0], [12.0]]), 3, 0)
+        self.record_check(
+            "Moving average edges divide partial sums by the full window",
+            close(trends["rolling_mean"][:, 0], [1, 3, 6, 9]),
+            str(trends["rolling_mean"].tolist())
+        )
+        self.record_check(
+            "Less than two weeks of rows leaves previous_week at zero",
+            close(trends["this_week"], [30]) and close(trends["previous_week"], [0]),
+            f"{trends['this_week'].tolist()} {trends['previous_week'].tolist()}"
+        )
+
+        # Every other day active: consistency is the active ratio over (1 + CV)
+        trends = compute_trends(np.array([[10.0], [0.0]] * 7), 7, 0)
+        self.record_check(
+            "Consistency discounts uneven days",
+            close(trends["active_ratio"], [0.5]) and close(trends["consistency"], [25]),
+            f"{trends['active_ratio'].tolist()} {trends['consistency'].tolist()}"
+        )
+
     def test_categories(self):
         """Test categories endpoints"""
         print("\n" + "="*50)
@@ -216,6 +531,227 @@ class ProgressTrackingAPITester:
         
         return activities
 
+    def test_activity_cursor_validation(self):
+        """Cursors that are not the [int, str] the API encodes are rejected with 400"""
+        print("\n" + "="*50)
+        print("TESTING ACTIVITY CURSOR VALIDATION")
+        print("="*50)
+
+        cursors = {
+            "operator document": [{"$gt": 0}, "x"],
+            "operator id": [0, {"$gt": ""}],
+            "int beyond 64 bits": [10**30, "x"],
+            "boolean": [True, "x"],
+        }
+        for name, key in cursors.items():
+            cursor = base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+            self.run_test(
+                f"Reject Cursor ({name})",
+                "GET",
+                f"activities?cursor={cursor}",
+                400,
+                description="Should answer 400 Invalid cursor"
+            )
+
+    def test_concurrent_activity_creation(self, categories, count=200):
+        """Fire parallel activity creates and check no XP or counts are lost"""
+        print("\n" + "="*50)
+        print("TESTING CONCURRENT ACTIVITY CREATION")
+        print("="*50)
+
+        if not categories:
+            return False
+
+        _, before = self.run_test("Get Stats Before Burst", "GET", "stats", 200)
+        if not before:
+            return False
+
+        # Non-overlapping 5 minute slots on a random past date so the burst
+        # never clashes with itself or with earlier runs
+        date = (datetime(1990, 1, 1) + timedelta(days=random.randrange(10000))).date().isoformat()
+        category = categories[0]
+        payloads = [{
+            "category_id": category['id'],
+            "category_name": category['name'],
+            "date": date,
+            "start_time": f"{(i * 5) // 60:02d}:{(i * 5) % 60:02d}",
+            "duration": 5,
+            "notes": "Concurrency test activity"
+        } for i in range(count)]
+
+        def create(payload):
+            return requests.post(f"{self.api_url}/activities", json=payload, timeout=30)
+
+        print(f"\n🔍 Creating {count} activities in parallel on {date}...")
+        with ThreadPoolExecutor(max_workers=50) as pool:
+            responses = list(pool.map(create, payloads))
+        created = [r.json() for r in responses if r.status_code == 200]
+        self.record_check(
+            f"All {count} parallel creates succeeded",
+            len(created) == count,
+            f"{len(created)} of {count} returned 200"
+        )
+
+        # Stats, streaks and badges are applied by a background queue after the
+        # creates return, so wait for the counters to settle before checking
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            stats = requests.get(f"{self.api_url}/stats", timeout=10).json()
+            if stats['total_activities'] - before['total_activities'] >= len(created):
+                break
+            time.sleep(0.5)
+
+        _, after = self.run_test("Get Stats After Burst", "GET", "stats", 200)
+        if after:
+            def total_xp(stats):
+                return 100 * stats['level'] * (stats['level'] - 1) // 2 + stats['xp']
+
+            gained = total_xp(after) - total_xp(before)
+            self.record_check(
+                "total_activities incremented exactly",
+                after['total_activities'] - before['total_activities'] == len(created),
+                f"expected +{len(created)}, got +{after['total_activities'] - before['total_activities']}"
+            )
+            self.record_check(
+                "XP incremented exactly",
+                gained == 50 * len(created),
+                f"expected +{50 * len(created)}, got +{gained}"
+            )
+
+        # Cleanup
+        with ThreadPoolExecutor(max_workers=50) as pool:
+            list(pool.map(lambda a: requests.delete(f"{self.api_url}/activities/{a['id']}", timeout=30), created))
+
+        return after
+
+    def test_bulk_import_cross_midnight(self, categories):
+        """Import a row that runs past midnight into an existing next-day activity"""
+        print("\n" + "="*50)
+        print("TESTING BULK IMPORT CROSS-MIDNIGHT CLASH")
+        print("="*50)
+
+        if not categories:
+            return False
+
+        day = datetime(1990, 1, 1) + timedelta(days=random.randrange(1, 10000))
+        category = categories[0]
+        _, existing = self.run_test(
+            "Create Next-Day Activity",
+            "POST",
+            "activities",
+            200,
+            {
+                "category_id": category['id'],
+                "category_name": category['name'],
+                "date": day.date().isoformat(),
+                "start_time": "01:00",
+                "duration": 30,
+                "notes": "Cross-midnight import test activity"
+            }
+        )
+        if not existing:
+            return False
+
+        _, report = self.run_test(
+            "Import Row Running Past Midnight",
+            "POST",
+            "activities/bulk",
+            200,
+            [{
+                "category_id": category['id'],
+                "category_name": category['name'],
+                "date": (day - timedelta(days=1)).date().isoformat(),
+                "start_time": "23:00",
+                "duration": 180,
+                "notes": "Cross-midnight import test activity"
+            }],
+            "23:00 + 3h on the day before should clash with the 01:00 activity"
+        )
+        if report:
+            self.record_check(
+                "Cross-midnight row rejected as a clash",
+                report.get('inserted') == 0 and report.get('failed') == 1,
+                f"inserted {report.get('inserted')}, failed {report.get('failed')}"
+            )
+
+        # Cleanup
+        self.run_test("Delete Next-Day Activity", "DELETE", f"activities/{existing['id']}", 200)
+        return report
+
+    def test_bulk_import_invalid_utf8(self):
+        """Rows that are not valid UTF-8 are reported as row errors, not a 500"""
+        print("\n" + "="*50)
+        print("TESTING BULK IMPORT INVALID UTF-8")
+        print("="*50)
+
+        uploads = {
+            "text/csv": b"category_id,date,start_time,duration,notes\nstudy,1990-01-01,10:00,30,caf\xe9\n",
+            "application/x-ndjson": b'{"category_id": "study", "date": "1990-01-01", "notes": "caf\xe9"}\n',
+        }
+        for content_type, body in uploads.items():
+            print(f"\n🔍 Importing a {content_type} row that is not valid UTF-8...")
+            response = requests.post(
+                f"{self.api_url}/activities/bulk", data=body, headers={"Content-Type": content_type}, timeout=10
+            )
+            report = response.json() if response.status_code == 200 else {}
+            self.record_check(
+                f"Invalid UTF-8 {content_type} row reported as a row error",
+                report.get("failed") == 1 and "UTF-8" in str(report.get("errors")),
+                f"{response.status_code} {response.text[:200]}"
+            )
+
+    def test_hourly_distribution(self):
+        """Minutes split across hour, midnight and window boundaries land on the right weekday and hour"""
+        print("\n" + "="*50)
+        print("TESTING HOURLY DISTRIBUTION")
+        print("="*50)
+
+        # A user of its own, so no other activity lands in the window
+        headers = {"X-User-Id": f"hourly-test-{uuid.uuid4().hex[:12]}"}
+        today = datetime.now(timezone.utc).date()
+        first_day = today - timedelta(days=6)
+        activities = [
+            # From the day before the 7-day window: only its last hour counts
+            (first_day - timedelta(days=1), "23:00", 120),
+            # Across midnight, and across two hour boundaries
+            (today - timedelta(days=3), "23:30", 90),
+            (today - timedelta(days=4), "10:45", 30),
+        ]
+        expected = [[0] * 24 for _ in range(7)]
+        expected[first_day.weekday()][0] += 60
+        expected[(today - timedelta(days=3)).weekday()][23] += 30
+        expected[(today - timedelta(days=2)).weekday()][0] += 30
+        expected[(today - timedelta(days=2)).weekday()][1] += 30
+        expected[(today - timedelta(days=4)).weekday()][10] += 15
+        expected[(today - timedelta(days=4)).weekday()][11] += 15
+
+        created = []
+        for date, start_time, duration in activities:
+            response = requests.post(f"{self.api_url}/activities", json={
+                "category_id": "study",
+                "category_name": "Study",
+                "date": date.isoformat(),
+                "start_time": start_time,
+                "duration": duration,
+            }, headers=headers, timeout=10)
+            if response.status_code == 200:
+                created.append(response.json()["id"])
+        self.record_check("Hourly test activities created", len(created) == len(activities), f"{len(created)} of {len(activities)}")
+
+        print(f"\n🔍 Getting the hourly distribution for {headers['X-User-Id']}...")
+        response = requests.get(f"{self.api_url}/analytics/hourly", params={"days": 7}, headers=headers, timeout=10)
+        hourly = response.json() if response.status_code == 200 else {}
+        self.record_check(
+            "Minutes per weekday and hour split at hour, midnight and window boundaries",
+            hourly.get("minutes") == expected and hourly.get("total") == 180,
+            f"{response.status_code} total={hourly.get('total')}"
+        )
+
+        # Cleanup
+        for activity_id in created:
+            requests.delete(f"{self.api_url}/activities/{activity_id}", headers=headers, timeout=10)
+        return hourly
+
     def test_badges(self):
         """Test badges endpoints"""
         print("\n" + "="*50)
@@ -315,9 +851,21 @@ def main():
     categories = tester.test_categories()
     stats = tester.test_user_stats()
     activities = tester.test_activities(categories)
+    tester.test_activity_cursor_validation()
+    tester.test_concurrent_activity_creation(categories)
+    tester.test_bulk_import_cross_midnight(categories)
+    tester.test_bulk_import_invalid_utf8()
+    tester.test_hourly_distribution()
     badges = tester.test_badges()
     analytics_summary, daily_data = tester.test_analytics()
     goals = tester.test_goals()
+
+    # In-process checks on an in-memory database
+    tester.test_clash_with_overlapping_stored_activities()
+    tester.test_coalescing_queue()
+    tester.test_outbox_replay_after_failure()
+    tester.test_windowed_streaks()
+    tester.test_compute_trends()
     
     # Print final results
     print("\n" + "="*60)
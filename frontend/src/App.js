@@ -15,10 +15,92 @@ import { Toaster } from './components/ui/sonner';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Without a user id the backend serves its default user.
+const USER_ID = process.env.REACT_APP_USER_ID;
+const USER_HEADERS = USER_ID ? { 'X-User-Id': USER_ID } : {};
+
 export const api = axios.create({
   baseURL: API,
+  headers: USER_HEADERS,
 });
 
+// GET /activities is keyset-paginated: follow X-Next-Cursor until exhausted.
+export const fetchAllActivities = async (params = {}) => {
+  const activities = [];
+  let cursor = null;
+  do {
+    const response = await api.get('/activities', { params: cursor ? { ...params, cursor } : params });
+    activities.push(...response.data);
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+  return activities;
+};
+
+// Live updates from GET /events, a Server-Sent Events stream of small deltas
+// ('activity.created', 'stats.updated', 'badge.earned', ...). `handlers` maps
+// event names to callbacks; 'resync' means events were missed and the page
+// should refetch. Uses fetch rather than EventSource so the request carries
+// the user header, and reconnects with Last-Event-ID to resume where it left
+// off. Returns the unsubscribe function.
+export const subscribeEvents = (handlers) => {
+  let lastEventId = null;
+  let stopped = false;
+  let controller = null;
+
+  const dispatch = (message) => {
+    let event = 'message';
+    const data = [];
+    for (const line of message.split('\n')) {
+      if (line.startsWith('id:')) lastEventId = line.slice(3).trim();
+      else if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+    }
+    if (data.length && handlers[event]) handlers[event](JSON.parse(data.join('\n')));
+  };
+
+  const listen = async () => {
+    while (!stopped) {
+      controller = new AbortController();
+      try {
+        const response = await fetch(`${API}/events`, {
+          headers: { ...USER_HEADERS, ...(lastEventId ? { 'Last-Event-ID': lastEventId } : {}) },
+          signal: controller.signal,
+        });
+        if (!response.ok) throw new Error(`Event stream failed: ${response.status}`);
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          let end;
+          while ((end = buffer.indexOf('\n\n')) !== -1) {
+            dispatch(buffer.slice(0, end));
+            buffer = buffer.slice(end + 2);
+          }
+        }
+      } catch (error) {
+        if (stopped) return;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 3000));
+    }
+  };
+
+  listen();
+  return () => {
+    stopped = true;
+    controller?.abort();
+  };
+};
+
+// Add or replace an item by id in a list held in state.
+export const upsertById = (items, item) =>
+  items.some((existing) => existing.id === item.id)
+    ? items.map((existing) => (existing.id === item.id ? { ...existing, ...item } : existing))
+    : [...items, item];
+
+export const removeById = (items, id) => items.filter((item) => item.id !== id);
+
 function App() {
   return (
     <div className="App min-h-screen bg-background">
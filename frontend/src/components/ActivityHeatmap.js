@@ -5,24 +5,24 @@ import './ActivityHeatmap.css';
 import { Tooltip } from './ui/tooltip';
 import { TooltipContent, TooltipProvider, TooltipTrigger } from './ui/tooltip';
 
-const ActivityHeatmap = ({ activities, categories }) => {
+// Expand the server's columnar heatmap ({ start, offsets, counts, minutes })
+// into one { date, count, minutes } value per active day
+const toHeatmapValues = ({ start, offsets, counts, minutes }) => {
+  const origin = new Date(`${start}T00:00:00Z`);
+  return offsets.map((offset, i) => {
+    const day = new Date(origin);
+    day.setUTCDate(origin.getUTCDate() + offset);
+    return { date: day.toISOString().split('T')[0], count: counts[i], minutes: minutes[i] };
+  });
+};
+
+const ActivityHeatmap = ({ data }) => {
   // Get date range for last 365 days
   const endDate = new Date();
   const startDate = new Date();
   startDate.setDate(startDate.getDate() - 365);
 
-  // Process activities into heatmap format
-  const activityMap = {};
-  activities.forEach((activity) => {
-    const date = activity.date;
-    if (!activityMap[date]) {
-      activityMap[date] = { date, count: 0, activities: [] };
-    }
-    activityMap[date].count += 1;
-    activityMap[date].activities.push(activity);
-  });
-
-  const heatmapData = Object.values(activityMap);
+  const heatmapData = data ? toHeatmapValues(data) : [];
 
   // Get intensity level based on activity count
   const getIntensityClass = (count) => {
@@ -55,7 +55,7 @@ const ActivityHeatmap = ({ activities, categories }) => {
               return null;
             }
             return {
-              'data-tip': `${value.date}: ${value.count} ${value.count === 1 ? 'activity' : 'activities'}`,
+              'data-tip': `${value.date}: ${value.count} ${value.count === 1 ? 'activity' : 'activities'} (${value.minutes}m)`,
             };
           }}
           showWeekdayLabels
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
-import { api } from '../App';
+import { api, fetchAllActivities, removeById, subscribeEvents, upsertById } from '../App';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
 import { Label } from '../components/ui/label';
@@ -13,6 +13,10 @@ import { jsPDF } from 'jspdf';
 import autoTable from 'jspdf-autotable';
 import * as XLSX from 'xlsx';
 
+// Newest first, the order GET /activities returns
+const byNewest = (a, b) =>
+  b.date.localeCompare(a.date) || b.start_time.localeCompare(a.start_time) || b.id.localeCompare(a.id);
+
 const Activities = () => {
   const [activities, setActivities] = useState([]);
   const [filteredActivities, setFilteredActivities] = useState([]);
@@ -32,6 +36,14 @@ const Activities = () => {
 
   useEffect(() => {
     fetchData();
+    // Changes from this and other tabs arrive as events and are patched in
+    return subscribeEvents({
+      'activity.created': (activity) => setActivities((current) => upsertById(current, activity).sort(byNewest)),
+      'activity.deleted': ({ id }) => setActivities((current) => removeById(current, id)),
+      'category.created': (category) => setCategories((current) => upsertById(current, category)),
+      'category.deleted': ({ id }) => setCategories((current) => removeById(current, id)),
+      resync: fetchData,
+    });
   }, []);
 
   useEffect(() => {
@@ -41,10 +53,10 @@ const Activities = () => {
   const fetchData = async () => {
     try {
       const [activitiesRes, categoriesRes] = await Promise.all([
-        api.get('/activities'),
+        fetchAllActivities(),
         api.get('/categories'),
       ]);
-      setActivities(activitiesRes.data);
+      setActivities(activitiesRes);
       setCategories(categoriesRes.data);
     } catch (error) {
       console.error('Error fetching data:', error);
@@ -76,7 +88,7 @@ const Activities = () => {
 
     try {
       const category = categories.find((c) => c.id === formData.category_id);
-      await api.post('/activities', {
+      const { data: created } = await api.post('/activities', {
         ...formData,
         category_name: category.name,
         duration: parseInt(formData.duration),
@@ -90,7 +102,7 @@ const Activities = () => {
         duration: '',
         notes: '',
       });
-      fetchData();
+      setActivities((current) => upsertById(current, created).sort(byNewest));
     } catch (error) {
       console.error('Error creating activity:', error);
       const errorMsg = error.response?.data?.detail || 'Failed to log activity';
@@ -102,7 +114,7 @@ const Activities = () => {
     try {
       await api.delete(`/activities/${id}`);
       toast.success('Activity deleted');
-      fetchData();
+      setActivities((current) => removeById(current, id));
     } catch (error) {
       console.error('Error deleting activity:', error);
       toast.error('Failed to delete activity');
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
-import { api } from '../App';
+import { api, removeById, subscribeEvents, upsertById } from '../App';
 import { Trophy, Star, Award, Crown, Flame, Footprints, Lock } from 'lucide-react';
 import { Card, CardContent } from '../components/ui/card';
 import { toast } from 'sonner';
@@ -19,6 +19,13 @@ const Badges = () => {
 
   useEffect(() => {
     fetchBadges();
+    // Badges earned or changed in this and other tabs arrive as events
+    return subscribeEvents({
+      'badge.created': (badge) => setBadges((current) => upsertById(current, badge)),
+      'badge.earned': (badge) => setBadges((current) => upsertById(current, badge)),
+      'badge.deleted': ({ id }) => setBadges((current) => removeById(current, id)),
+      resync: fetchBadges,
+    });
   }, []);
 
   const fetchBadges = async () => {
@@ -11,7 +11,7 @@ import ActivityHeatmap from '../components/ActivityHeatmap';
 const Dashboard = () => {
   const [stats, setStats] = useState(null);
   const [activities, setActivities] = useState([]);
-  const [allActivities, setAllActivities] = useState([]);
+  const [heatmap, setHeatmap] = useState(null);
   const [categories, setCategories] = useState([]);
   const [dailyData, setDailyData] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -23,17 +23,12 @@ const Dashboard = () => {
 
   const fetchDashboardData = async () => {
     try {
-      const [statsRes, activitiesRes, categoriesRes, dailyRes] = await Promise.all([
-        api.get('/stats'),
-        api.get('/activities'),
-        api.get('/categories'),
-        api.get('/analytics/daily?days=7'),
-      ]);
-      setStats(statsRes.data);
-      setAllActivities(activitiesRes.data);
-      setActivities(activitiesRes.data.slice(0, 5));
-      setCategories(categoriesRes.data);
-      setDailyData(dailyRes.data);
+      const { data } = await api.get('/dashboard');
+      setStats(data.stats);
+      setActivities(data.recent_activities);
+      setCategories(data.categories);
+      setDailyData(data.daily);
+      setHeatmap(data.heatmap);
     } catch (error) {
       console.error('Error fetching dashboard data:', error);
     } finally {
@@ -180,7 +175,7 @@ const Dashboard = () => {
         className="mb-8 bg-white p-6 rounded-xl border-2 border-black shadow-brutal"
         data-testid="activity-heatmap"
       >
-        <ActivityHeatmap activities={allActivities} categories={categories} />
+        <ActivityHeatmap data={heatmap} />
       </motion.div>
 
       {/* Charts and Recent Activities */}
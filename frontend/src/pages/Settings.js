@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
-import { api } from '../App';
+import { api, removeById, subscribeEvents, upsertById } from '../App';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
 import { Label } from '../components/ui/label';
@@ -30,6 +30,15 @@ const Settings = () => {
 
   useEffect(() => {
     fetchData();
+    // Changes from this and other tabs arrive as events and are patched in
+    return subscribeEvents({
+      'category.created': (category) => setCategories((current) => upsertById(current, category)),
+      'category.deleted': ({ id }) => setCategories((current) => removeById(current, id)),
+      'badge.created': (badge) => setBadges((current) => upsertById(current, badge)),
+      'badge.earned': (badge) => setBadges((current) => upsertById(current, badge)),
+      'badge.deleted': ({ id }) => setBadges((current) => removeById(current, id)),
+      resync: fetchData,
+    });
   }, []);
 
   const fetchData = async () => {
@@ -54,11 +63,11 @@ const Settings = () => {
     }
 
     try {
-      await api.post('/categories', categoryFormData);
+      const { data: created } = await api.post('/categories', categoryFormData);
       toast.success('Category created successfully!');
       setShowCategoryForm(false);
       setCategoryFormData({ name: '', icon: 'Star', color: '#10B981' });
-      fetchData();
+      setCategories((current) => upsertById(current, created));
     } catch (error) {
       console.error('Error creating category:', error);
       toast.error('Failed to create category');
@@ -71,9 +80,13 @@ const Settings = () => {
       toast.error('Please fill in all required fields');
       return;
     }
+    if (badgeFormData.condition_type === 'category_specific' && !badgeFormData.category_id) {
+      toast.error('Please select a category');
+      return;
+    }
 
     try {
-      await api.post('/badges', badgeFormData);
+      const { data: created } = await api.post('/badges', badgeFormData);
       toast.success('Badge created successfully!');
       setShowBadgeForm(false);
       setBadgeFormData({
@@ -83,7 +96,7 @@ const Settings = () => {
         condition_type: 'activity_count',
         condition_value: 10,
       });
-      fetchData();
+      setBadges((current) => upsertById(current, created));
     } catch (error) {
       console.error('Error creating badge:', error);
       toast.error('Failed to create badge');
@@ -94,7 +107,7 @@ const Settings = () => {
     try {
       await api.delete(`/categories/${id}`);
       toast.success('Category deleted');
-      fetchData();
+      setCategories((current) => removeById(current, id));
     } catch (error) {
       console.error('Error deleting category:', error);
       toast.error('Failed to delete category');
@@ -105,7 +118,7 @@ const Settings = () => {
     try {
       await api.delete(`/badges/${id}`);
       toast.success('Badge deleted');
-      fetchData();
+      setBadges((current) => removeById(current, id));
     } catch (error) {
       console.error('Error deleting badge:', error);
       toast.error('Failed to delete badge');
@@ -240,9 +253,23 @@ const Settings = () => {
                           <SelectItem value="activity_count">Total Activities</SelectItem>
                           <SelectItem value="streak">Streak Days</SelectItem>
                           <SelectItem value="level">Reach Level</SelectItem>
+                          <SelectItem value="category_specific">Category Activities</SelectItem>
                         </SelectContent>
                       </Select>
                     </div>
+                    {badgeFormData.condition_type === 'category_specific' && (
+                      <div>
+                        <Label className="font-bold">Category *</Label>
+                        <Select value={badgeFormData.category_id} onValueChange={(value) => setBadgeFormData({ ...badgeFormData, category_id: value })}>
+                          <SelectTrigger className="border-2 border-black" data-testid="badge-category-select"><SelectValue placeholder="Select a category" /></SelectTrigger>
+                          <SelectContent>
+                            {categories.map((category) => (
+                              <SelectItem key={category.id} value={category.id}>{category.name}</SelectItem>
+                            ))}
+                          </SelectContent>
+                        </Select>
+                      </div>
+                    )}
                     <div>
                       <Label htmlFor="condition-value" className="font-bold">Condition Value *</Label>
                       <Input id="condition-value" type="number" value={badgeFormData.condition_value} onChange={(e) => setBadgeFormData({ ...badgeFormData, condition_value: parseInt(e.target.value) })} placeholder="e.g., 50" className="border-2 border-black" data-testid="condition-value-input" />
@@ -250,6 +277,7 @@ const Settings = () => {
                         {badgeFormData.condition_type === 'activity_count' && 'Number of activities to log'}
                         {badgeFormData.condition_type === 'streak' && 'Consecutive days to maintain'}
                         {badgeFormData.condition_type === 'level' && 'Level to reach'}
+                        {badgeFormData.condition_type === 'category_specific' && 'Number of activities to log in the category'}
                       </p>
                     </div>
                     <div className="flex gap-3">
@@ -7,9 +7,14 @@ import { Input } from '../components/ui/input';
 import { Label } from '../components/ui/label';
 import { toast } from 'sonner';
 
+const MINUTES_PER_DAY = 24 * 60;
+
+// Minutes of an activity that fall inside the selected day
+const minutesInDay = (activity) =>
+  Math.min(activity.end_offset, MINUTES_PER_DAY) - Math.max(activity.start_offset, 0);
+
 const Timeline = () => {
   const [activities, setActivities] = useState([]);
-  const [categories, setCategories] = useState([]);
   const [selectedDate, setSelectedDate] = useState(new Date().toISOString().split('T')[0]);
   const [timelineData, setTimelineData] = useState([]);
 
@@ -19,22 +24,18 @@ const Timeline = () => {
 
   const fetchData = async () => {
     try {
-      const [activitiesRes, categoriesRes] = await Promise.all([
-        api.get('/activities'),
-        api.get('/categories'),
-      ]);
-      setActivities(activitiesRes.data);
-      setCategories(categoriesRes.data);
-      processTimelineData(activitiesRes.data, categoriesRes.data);
+      const response = await api.get(`/timeline/${selectedDate}`);
+      setActivities(response.data.activities);
+      processTimelineData(response.data.activities);
     } catch (error) {
       console.error('Error fetching data:', error);
       toast.error('Failed to load timeline');
     }
   };
 
-  const processTimelineData = (allActivities, allCategories) => {
-    const dayActivities = allActivities.filter(a => a.date === selectedDate);
-    
+  // Activities arrive sorted with start/end offsets in minutes from midnight;
+  // only the split into hour blocks happens here
+  const processTimelineData = (dayActivities) => {
     // Create 24-hour timeline blocks
     const timeline = [];
     for (let hour = 0; hour < 24; hour++) {
@@ -45,33 +46,24 @@ const Timeline = () => {
       });
     }
 
-    // Place activities at their actual logged times
     dayActivities.forEach(activity => {
-      const category = allCategories.find(c => c.id === activity.category_id);
-      
-      // Parse start time
-      const [startHour, startMinute] = activity.start_time.split(':').map(Number);
-      const duration = activity.duration;
-      
-      // Calculate which hours this activity spans
-      let remainingMinutes = duration;
-      let currentHour = startHour;
-      let currentMinute = startMinute;
-      
-      while (remainingMinutes > 0 && currentHour < 24) {
-        const minutesInThisHour = Math.min(remainingMinutes, 60 - currentMinute);
-        
-        timeline[currentHour].activities.push({
+      const category = { color: activity.color, icon: activity.icon };
+      let current = Math.max(activity.start_offset, 0);
+      const end = Math.min(activity.end_offset, MINUTES_PER_DAY);
+
+      while (current < end) {
+        const hour = Math.floor(current / 60);
+        const minutesInThisHour = Math.min(end, (hour + 1) * 60) - current;
+
+        timeline[hour].activities.push({
           ...activity,
           category,
           minutesInHour: minutesInThisHour,
-          startMinuteInHour: currentMinute
+          startMinuteInHour: current % 60
         });
-        timeline[currentHour].totalMinutes += minutesInThisHour;
-        
-        remainingMinutes -= minutesInThisHour;
-        currentHour++;
-        currentMinute = 0; // After first hour, always start at :00
+        timeline[hour].totalMinutes += minutesInThisHour;
+
+        current += minutesInThisHour;
       }
     });
 
@@ -85,23 +77,20 @@ const Timeline = () => {
   };
 
   const getTotalDuration = () => {
-    return activities
-      .filter(a => a.date === selectedDate)
-      .reduce((sum, a) => sum + a.duration, 0);
+    return activities.reduce((sum, a) => sum + minutesInDay(a), 0);
   };
 
   const getCategoryBreakdown = () => {
-    const dayActivities = activities.filter(a => a.date === selectedDate);
     const breakdown = {};
     
-    dayActivities.forEach(activity => {
+    activities.forEach(activity => {
       if (!breakdown[activity.category_name]) {
         breakdown[activity.category_name] = {
           duration: 0,
-          color: categories.find(c => c.id === activity.category_id)?.color
+          color: activity.color
         };
       }
-      breakdown[activity.category_name].duration += activity.duration;
+      breakdown[activity.category_name].duration += minutesInDay(activity);
     });
     
     return breakdown;